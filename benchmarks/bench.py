@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Parser benchmarks over synthetic accounting files of every dialect.
+
+Each case parses a generated file in a fresh process and reports rows per second, megabytes per second and the peak
+resident memory of that process.  Files are generated once into the work directory and reused while their row
+count and seed match.
+
+    $ python benchmarks/bench.py --rows 500000
+    $ python benchmarks/bench.py --dialect uge --mode lazy --mode to_json --json > results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gridengine_accounting import AccountFile, UGEAccountFile
+from gridengine_accounting.synthetic import DIALECTS, write_accounting
+
+
+def _iterate(reader):
+    for entry in reader:
+        pass
+
+
+def _to_dict(reader):
+    for entry in reader:
+        entry.to_dict()
+
+
+def _to_json(reader):
+    for entry in reader:
+        # UGEAccountEntry has no to_json, AccountEntry.to_json is the same json.dumps of to_dict.
+        json.dumps(entry.to_dict())
+
+# Mode name to (function consuming a reader, keyword arguments of the reader).
+MODES = {
+    "iterate": (_iterate, {}),
+    "lazy": (_iterate, {"lazy": True}),
+    "to_dict": (_to_dict, {}),
+    "to_json": (_to_json, {}),
+}
+
+
+def generate(work_dir, dialect, rows, seed):
+    """Returns the path of the synthetic file for a dialect, writing it if needed."""
+    path = os.path.join(work_dir, "accounting-%s-%d-%d" % (dialect, rows, seed))
+    if not os.path.exists(path):
+        with open(path + ".tmp", "w") as fp:
+            write_accounting(fp, dialect, rows, seed)
+        os.rename(path + ".tmp", path)
+    return path
+
+
+def _run(path, dialect, mode):
+    consume, kwargs = MODES[mode]
+    reader_class = UGEAccountFile if dialect == "uge" else AccountFile
+    start = time.time()
+    with open(path) as f:
+        consume(reader_class(f, **kwargs))
+    elapsed = time.time() - start
+    # ru_maxrss is in kilobytes on Linux and in bytes on Mac OS X.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return elapsed, peak
+
+
+def measure(path, dialect, mode, rows):
+    """
+    Parses a file in a child process.
+
+    :return: Dict of the case and its rows_per_sec, mb_per_sec and peak_rss_mb.
+    """
+    pool = multiprocessing.Pool(1)
+    try:
+        elapsed, peak = pool.apply(_run, (path, dialect, mode))
+    finally:
+        pool.terminate()
+    size = os.path.getsize(path)
+    return {
+        "dialect": dialect,
+        "mode": mode,
+        "rows": rows,
+        "bytes": size,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed,
+        "mb_per_sec": size / elapsed / 1e6,
+        "peak_rss_mb": peak / 1024.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="rows per generated file")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    parser.add_argument("--dialect", action="append", choices=DIALECTS, help="dialect to run, default all")
+    parser.add_argument("--mode", action="append", choices=sorted(MODES), help="mode to run, default all")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the fastest is reported")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "gridengine-accounting-bench"),
+                        help="directory for generated files")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+    results = []
+    for dialect in args.dialect or DIALECTS:
+        path = generate(args.work_dir, dialect, args.rows, args.seed)
+        for mode in args.mode or sorted(MODES):
+            if mode == "lazy" and dialect != "uge":
+                continue
+            runs = [measure(path, dialect, mode, args.rows) for i in range(args.repeat)]
+            result = min(runs, key=lambda run: run["seconds"])
+            result["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+            results.append(result)
+            if not args.json:
+                print("%-6s %-8s %10.0f rows/s %8.1f MB/s %8.1f MB peak RSS" % (
+                    dialect, mode, result["rows_per_sec"], result["mb_per_sec"], result["peak_rss_mb"]))
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,46 +14,1116 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+import bz2
+import gzip
+import io
 import json
+import collections
+import multiprocessing
+import operator
+import os
+import threading
+import time
+import timeit
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    _string_types = basestring
+except NameError:
+    _string_types = str
+
+if bytes is str:
+    def _text(line):
+        return line
+
+    def _text_size(line):
+        return len(line)
+else:
+    # Files opened from a path, and other binary files, give bytes on Python 3.  Rows are decoded as UTF-8, with
+    # undecodable bytes kept as surrogates so that they can be encoded back to the same bytes.
+    def _text(line):
+        if isinstance(line, bytes):
+            return line.decode("utf-8", "surrogateescape")
+        return line
+
+    def _text_size(line):
+        return len(line.encode("utf-8", "surrogateescape"))
+
+
+def _from_milliseconds(value):
+    return float(value) / 1000
+
+# Column layout of a Univa Grid Engine 8.2 accounting row, as (attribute, kind) pairs.  Kind is one of "str",
+# "int", "float" or "ms"; "ms" columns hold a time in milliseconds and are converted to seconds.  The entry
+# decoders, filters and column readers are all generated from these tables.
+UGE_FIELDS = [
+    ("qname", "str"),
+    ("hostname", "str"),
+    ("group", "str"),
+    ("owner", "str"),
+    ("job_name", "str"),
+    ("job_number", "int"),
+    ("account", "str"),
+    ("priority", "int"),
+    ("submission_time", "ms"),
+    ("start_time", "ms"),
+    ("end_time", "ms"),
+    ("failed", "int"),
+    ("exit_status", "int"),
+    ("ru_wallclock", "ms"),
+    ("ru_utime", "float"),
+    ("ru_stime", "float"),
+    ("ru_maxrss", "float"),
+    ("ru_ixrss", "float"),
+    ("ru_ismrss", "float"),
+    ("ru_idrss", "float"),
+    ("ru_isrss", "float"),
+    ("ru_minflt", "float"),
+    ("ru_majflt", "float"),
+    ("ru_nswap", "float"),
+    ("ru_inblock", "float"),
+    ("ru_oublock", "float"),
+    ("ru_msgsnd", "float"),
+    ("ru_msgrcv", "float"),
+    ("ru_nsignals", "float"),
+    ("ru_nvcsw", "float"),
+    ("ru_nivcsw", "float"),
+    ("project", "str"),
+    ("department", "str"),
+    ("granted_pe", "str"),
+    ("slots", "int"),
+    ("task_number", "int"),
+    ("cpu", "float"),
+    ("mem", "float"),
+    ("io", "float"),
+    ("category", "str"),
+    ("iow", "float"),
+    ("pe_taskid", "str"),
+    ("maxvmem", "int"),
+    ("arid", "int"),
+    ("ar_submission_time", "ms"),
+    ("job_class", "str"),
+    ("qdel_info", "str"),
+    ("maxrss", "int"),
+    ("maxpss", "int"),
+    ("submit_host", "str"),
+    ("cwd", "str"),
+    ("submit_cmd", "str"),
+]
+
+
+
+def _none(value):
+    if value == "NONE":
+        return None
+    return value
+
+
+def _optional_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+CONVERTERS = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "ms": _from_milliseconds,
+    "none": _none,
+    "optional_int": _optional_int,
+}
+
+# Column layout of a Sun Grid Engine 6.x accounting row.  Kind "none" is a string where NONE becomes None and
+# "optional_int" is an integer that becomes None when it is not set.
+SGE_FIELDS = [
+    ("qname", "str"),
+    ("hostname", "str"),
+    ("group", "str"),
+    ("owner", "str"),
+    ("job_name", "str"),
+    ("job_number", "int"),
+    ("account", "str"),
+    ("priority", "int"),
+    ("submission_time", "int"),
+    ("start_time", "int"),
+    ("end_time", "int"),
+    ("failed", "int"),
+    ("exit_status", "int"),
+    ("ru_wallclock", "int"),
+    ("ru_utime", "float"),
+    ("ru_stime", "float"),
+    ("ru_maxrss", "float"),
+    ("ru_ixrss", "float"),
+    ("ru_ismrss", "float"),
+    ("ru_idrss", "float"),
+    ("ru_isrss", "float"),
+    ("ru_minflt", "float"),
+    ("ru_majflt", "float"),
+    ("ru_nswap", "float"),
+    ("ru_inblock", "float"),
+    ("ru_oublock", "float"),
+    ("ru_msgsnd", "float"),
+    ("ru_msgrcv", "float"),
+    ("ru_nsignals", "float"),
+    ("ru_nvcsw", "float"),
+    ("ru_nivcsw", "float"),
+    ("project", "none"),
+    ("department", "none"),
+    ("granted_pe", "none"),
+    ("slots", "int"),
+    ("task_number", "int"),
+    ("cpu", "float"),
+    ("mem", "float"),
+    ("io", "float"),
+    ("catagory", "none"),
+    ("iow", "float"),
+    ("pe_taskid", "optional_int"),
+    ("maxvmem", "float"),
+    ("arid", "int"),
+    ("ar_submission_time", "float"),
+]
+
+# Values of the fields that are missing from some of the SGE dialects.
+SGE_DEFAULTS = {
+    "exit_status": 0,
+    "iow": 0.0,
+    "pe_taskid": None,
+    "maxvmem": 0.0,
+    "arid": 0,
+    "ar_submission_time": 0.0,
+}
+
+_SGE_NAMES = [name for name, kind in SGE_FIELDS]
+
+# Column names of each SGE dialect in file order, None marks a column that is not used.
+SGE_DIALECTS = {
+    "sge": _SGE_NAMES,  # SGE 6.x accounting file
+    "sge46": _SGE_NAMES + [None],  # SGE 6.x with a trailing column
+    "acct": [None, None] + _SGE_NAMES,  # Reporting file acct row, prefixed with time and "acct"
+    "univa": [name for name in _SGE_NAMES if name not in SGE_DEFAULTS],  # Univa UD
+}
+
+
+def _sge_dialect(fields):
+    """Returns the name of the SGE dialect of a split row, or None if the row is not an accounting row."""
+    if len(fields) in [45, 46]:
+        try:
+            int(fields[0])  # standard SGE row doesnt start with int
+        except ValueError:
+            if len(fields) == 45:
+                return "sge"
+            return "sge46"
+    elif len(fields) == 47 and fields[1] == "acct":
+        return "acct"
+    elif len(fields) == 39:
+        return "univa"
+    return None
+
+
+def _field_index(names, fields):
+    """Maps each attribute name to (column index, converter), or (None, default) when the column is missing."""
+    kinds = dict(fields)
+    index = {}
+    for i, name in enumerate(names):
+        if name is not None:
+            index[name] = (i, CONVERTERS[kinds[name]])
+    for name, kind in fields:
+        if name not in index:
+            index[name] = (None, SGE_DEFAULTS[name])
+    return index
+
+_SGE_INDEXES = dict((dialect, _field_index(names, SGE_FIELDS)) for dialect, names in SGE_DIALECTS.items())
+
+# Python expression converting column i, for each field kind.
+_DECODE_EXPRESSIONS = {
+    "str": "f[%(i)d]",
+    "int": "int(f[%(i)d])",
+    "float": "float(f[%(i)d])",
+    "ms": "float(f[%(i)d]) / 1000",
+    "none": "None if f[%(i)d] == 'NONE' else f[%(i)d]",
+    "optional_int": "_optional_int(f[%(i)d])",
+}
+
+
+def _compile_decoder(names, fields, prefix="", defaults=None):
+    """
+    Generates a function decode(entry, fields) that sets one attribute of entry per field of a split row.  Names
+    gives the field name of each column, fields the kind of each name, and defaults the value of any field with no
+    column.  Attribute names are the field names with prefix added.
+    """
+    kinds = dict(fields)
+    lines = ["def decode(self, f):"]
+    for i, name in enumerate(names):
+        if name is not None:
+            lines.append("    self.%s%s = %s" % (prefix, name, _DECODE_EXPRESSIONS[kinds[name]] % {"i": i}))
+    for name, kind in fields:
+        if name not in names:
+            lines.append("    self.%s%s = %r" % (prefix, name, defaults[name]))
+    namespace = {"_optional_int": _optional_int}
+    exec(compile("\n".join(lines), "<%s decoder>" % prefix, "exec"), namespace)
+    return namespace["decode"]
+
+_SGE_DIALECT_BY_LENGTH = dict((len(names), dialect) for dialect, names in SGE_DIALECTS.items())
+_SGE_DECODERS = dict((dialect, _compile_decoder(names, SGE_FIELDS, "_", SGE_DEFAULTS))
+                     for dialect, names in SGE_DIALECTS.items())
+
+
+def _compile_where(where, index):
+    """
+    Builds a predicate over a split row from a where argument.  Where is either a callable that is passed the split
+    row, or a dict of criteria keyed by attribute name.  A criterion value may be a set, list or tuple of allowed
+    values, a callable that is passed the converted value, or a plain value that must be equal.  Keys ending in
+    _between take a (low, high) tuple and match inclusively.
+    """
+    if where is None or callable(where):
+        return where
+    tests = []
+    for key, value in where.items():
+        name = key
+        if key.endswith("_between"):
+            name = key[:-len("_between")]
+            low, high = value
+            test = lambda v, low=low, high=high: low <= v <= high
+        elif callable(value):
+            test = value
+        elif isinstance(value, (set, frozenset, list, tuple)):
+            test = frozenset(value).__contains__
+        else:
+            test = lambda v, value=value: v == value
+        if name not in index:
+            raise ValueError("Unknown field: %s" % name)
+        i, convert = index[name]
+        if i is None:
+            if test(convert):  # Column not present in this dialect, convert holds its default value.
+                continue
+            return lambda fields: False
+        tests.append((i, convert, test))
 
+    def predicate(fields):
+        for i, convert, test in tests:
+            if not test(convert(fields[i])):
+                return False
+        return True
+    return predicate
 
-class AccountFile(object):
+
+# Attribute name to (field index, converter) for UGE rows.
+_UGE_INDEX = dict((name, (i, CONVERTERS[kind])) for i, (name, kind) in enumerate(UGE_FIELDS))
+
+_decode_uge = _compile_decoder([name for name, kind in UGE_FIELDS], UGE_FIELDS)
+
+# Pickled state of a UGEAccountEntry, the tuple of its values in UGE_FIELDS order, and the function restoring it.
+_uge_state = operator.attrgetter(*[name for name, kind in UGE_FIELDS])
+_namespace = {}
+exec("def restore(self, values):\n    (%s,) = values" % ", ".join("self." + name for name, kind in UGE_FIELDS),
+     _namespace)
+_restore_uge = _namespace.pop("restore")
+
+
+def _milliseconds_property(name):
+    """Returns a property giving the value of the attribute name, which is in seconds, in milliseconds."""
+    def getter(self):
+        value = round(getattr(self, name) * 1000, 3)
+        if value.is_integer():
+            return int(value)
+        return value
+    return property(getter)
+
+
+class _DecompressedReader(io.RawIOBase):
+    """Raw stream over a decompressing file object, so it can be wrapped in an io.BufferedReader."""
     def __init__(self, file_ob):
+        io.RawIOBase.__init__(self)
         self._file_ob = file_ob
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._file_ob.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._file_ob.close()
+        io.RawIOBase.close(self)
+
+
+class _ReadAheadReader(_DecompressedReader):
+    """Raw stream that decompresses in a background thread, keeping up to blocks blocks ready to be read."""
+    def __init__(self, file_ob, block_size, blocks=4):
+        _DecompressedReader.__init__(self, file_ob)
+        self._queue = queue.Queue(blocks)
+        self._block = b""
+        self._pos = 0
+        self._eof = False
+        thread = threading.Thread(target=self._read_ahead, args=(block_size,))
+        thread.daemon = True
+        thread.start()
+
+    def _read_ahead(self, block_size):
+        try:
+            while True:
+                data = self._file_ob.read(block_size)
+                self._queue.put(data)
+                if not data:
+                    break
+        except Exception as e:
+            self._queue.put(e)
+
+    def readinto(self, b):
+        while self._pos >= len(self._block):
+            if self._eof:
+                return 0
+            data = self._queue.get()
+            if isinstance(data, Exception):
+                raise data
+            if not data:
+                self._eof = True
+                return 0
+            self._block = data
+            self._pos = 0
+        n = min(len(b), len(self._block) - self._pos)
+        b[:n] = self._block[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def open_accounting(path, buffer_size=4 * 1024 * 1024, threaded=False):
+    """
+    Opens an accounting file for reading.  Files ending in .gz, .bz2, .xz or .zst are decompressed as they are
+    read, .xz needs the lzma module (backports.lzma on Python 2) and .zst needs the zstandard package.  The readers
+    call this when they are given a path instead of a file object.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile, open_accounting
+        >>> for ac in UGEAccountFile(open_accounting("accounting.0.gz", threaded=True)):
+        ...     print ac.job_number
+        [...]
+
+    :param path: Path to the accounting file.
+    :param buffer_size: Size in bytes of each read from the file.
+    :param threaded: Decompress in a background thread, so decompression overlaps with parsing.
+    :return: File object.
+    """
+    if path.endswith(".gz"):
+        f = gzip.GzipFile(path, "rb")
+    elif path.endswith(".bz2"):
+        f = bz2.BZ2File(path, "rb")
+    elif path.endswith(".xz"):
+        if lzma is None:
+            raise ImportError("Reading .xz files requires the lzma module")
+        f = lzma.LZMAFile(path, "rb")
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("Reading .zst files requires the zstandard package")
+        f = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+    else:
+        return open(path, "rb", buffer_size)
+    if threaded:
+        raw = _ReadAheadReader(f, buffer_size)
+    else:
+        raw = _DecompressedReader(f)
+    return io.BufferedReader(raw, buffer_size)
+
+
+# Number of bytes the readers read from the file at a time.
+BLOCK_SIZE = 8 * 1024 * 1024
+
+_clock = timeit.default_timer
+
+
+def _split_ranges(path, chunk_size):
+    """Splits the file at path into (start, end) byte ranges of about chunk_size bytes, each ending on a newline."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+try:
+    _plain_file_types = (io.FileIO, file)
+except NameError:
+    _plain_file_types = (io.FileIO,)
+
+
+def _plain_file_path(file_ob):
+    """Returns the path of a file object reading a file directly, or None for decompressed and in memory files."""
+    raw = getattr(file_ob, "buffer", file_ob)
+    raw = getattr(raw, "raw", raw)
+    if isinstance(raw, _plain_file_types) and isinstance(raw.name, _string_types):
+        return raw.name
+    return None
+
+
+def _moved_error(error, rows, offset):
+    """Returns a MalformedRowError from a range of a file, with its position in the whole file."""
+    return MalformedRowError(error.reason, error.line_number + rows,
+                             None if error.offset is None else error.offset + offset, error.row)
+
+
+def _parse_range(args):
+    """
+    Parses one range of a file for parallel().  Returns (result, stats, errors, error): the result of func, or the
+    list of entries, the ParseStats and collected errors of the range, and the MalformedRowError that stopped it if
+    any.  Error offsets are moved to positions in the file, their line numbers are fixed up by the parent.
+    """
+    cls, path, start, end, func, kwargs = args
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    reader = cls(io.BytesIO(data), **kwargs)
+    result = error = None
+    try:
+        result = func(reader) if func is not None else list(reader)
+    except MalformedRowError as e:
+        error = _moved_error(e, 0, start)
+    errors = [_moved_error(e, 0, start) for e in reader.errors]
+    return result, reader.stats, errors, error
+
+
+class Checkpoint(object):
+    """
+    Position of a reader in a live accounting file: the byte offset after the last row that was consumed, and the
+    inode of the file so that a rotated file is noticed.  Used by :py:meth:`AccountFile.follow`.
+    """
+    def __init__(self, offset=0, inode=None):
+        self.offset = offset
+        self.inode = inode
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a checkpoint saved with :py:meth:`save`, a missing file gives a checkpoint at the start of the file.
+
+        :param path: Path to the checkpoint file.
+        :rtype: Checkpoint
+        """
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            d = json.load(f)
+        return cls(d["offset"], d["inode"])
+
+    def save(self, path):
+        """
+        Atomically writes the checkpoint to path.
+
+        :param path: Path to the checkpoint file.
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"offset": self.offset, "inode": self.inode}, f)
+        os.rename(tmp_path, path)
+
+
+class ParseStats(object):
+    """
+    Counters and timings of a reader, as returned by :py:attr:`AccountFile.stats`.
+
+    :ivar rows: Rows read, comment and rejected rows included.
+    :ivar comments: Comment rows.
+    :ivar rejected: Rows that are not valid accounting rows.
+    :ivar filtered: Rows dropped by where.
+    :ivar entries: Rows returned as entries.
+    :ivar bytes: Bytes read from the file.
+    :ivar dialects: Dict of dialect name, one of SGE_DIALECTS or "uge", to number of valid rows.
+    :ivar timings: Dict of stage to seconds spent in it.  read is reading the file and split is splitting it into
+        rows and fields and checking them, convert is converting field values and construct is creating entry
+        objects.  Only read and the splitting of blocks into rows are timed unless the reader was created with
+        profile=True.
+    """
+    STAGES = ["read", "split", "convert", "construct"]
+
+    def __init__(self):
+        self.rows = 0
+        self.comments = 0
+        self.rejected = 0
+        self.filtered = 0
+        self.entries = 0
+        self.bytes = 0
+        self.dialects = {}
+        self.timings = dict((stage, 0.0) for stage in self.STAGES)
+
+    def to_dict(self):
+        d = dict(self.__dict__)
+        d["dialects"] = dict(self.dialects)
+        d["timings"] = dict(self.timings)
+        return d
+
+    def merge(self, other):
+        """Adds the counts and timings of other, such as the stats of another part of the same file."""
+        for name in ["rows", "comments", "rejected", "filtered", "entries", "bytes"]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for dialect, rows in other.dialects.items():
+            self.dialects[dialect] = self.dialects.get(dialect, 0) + rows
+        for stage, seconds in other.timings.items():
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+class MalformedRowError(ValueError):
+    """
+    A row that could not be read, raised or collected by a reader depending on its errors policy.
+
+    :ivar reason: What is wrong with the row.
+    :ivar line_number: Line number of the row in the file, starting at 1.
+    :ivar offset: Byte offset of the start of the row, or None if it is not known.
+    :ivar row: Text of the row, cut to ROW_LENGTH characters.
+    """
+    ROW_LENGTH = 256
+
+    def __init__(self, reason, line_number, offset, row):
+        ValueError.__init__(self, "%s at line %d, offset %s" % (reason, line_number, offset))
+        self.reason = reason
+        self.line_number = line_number
+        self.offset = offset
+        self.row = row[:self.ROW_LENGTH]
+
+    def __reduce__(self):
+        # Rebuilt from all four values, so the error can be passed back from a worker process.
+        return self.__class__, (self.reason, self.line_number, self.offset, self.row)
+
+
+# Ways a reader can handle malformed rows.
+ERROR_POLICIES = ["raise", "skip", "collect"]
+
+
+class AccountFile(object):
+    """
+    Iterator that returns a new AccountEntry object for every valid row in a Sun Grid Engine accounting file, or
+    for every acct row in a reporting file.
+
+    Rows can be filtered before any entry is built by passing where, either a callable that is given the row split
+    on ":" and returns True to keep it, or a dict of criteria on the entry attributes::
+
+        >>> from gridengine_accounting import AccountFile
+        >>> f = open("accounting")
+        >>> for ac in AccountFile(f, where={"owner": "alice", "end_time_between": (t0, t1)}):
+        ...     print ac.job_number
+        [...]
+
+    Criteria values may be a single value, a set of allowed values, or a callable that is given the converted
+    value.  Keys ending in _between take an inclusive (low, high) range.
+
+    The file may also be given as a path, compressed files are then read through :py:func:`open_accounting`.  It
+    is read in blocks of block_size bytes, which are split into rows in bulk.
+
+    Rows that can not be read are handled according to errors: "raise" raises a :py:class:`MalformedRowError`, "skip"
+    skips them, and "collect" skips them and keeps the first max_errors errors in :py:attr:`errors`.  Rows of other
+    record types in a reporting file are skipped and are not errors.
+
+    Counts of rows read, skipped and returned are kept in :py:attr:`stats`.  When profile is True the time spent
+    converting fields and creating entries is also measured, which slows parsing.  hook, if given, is called with
+    the stats after every block is read and at the end of the file, for export to a metrics system.
+    """
+    # Dialect reported in stats for rows that match the file layout without detection.
+    _fixed_dialect = None
+
+    def __init__(self, file_ob, where=None, block_size=BLOCK_SIZE, profile=False, hook=None, errors="collect",
+                 max_errors=100):
+        if errors not in ERROR_POLICIES:
+            raise ValueError("errors must be one of %s" % ", ".join(ERROR_POLICIES))
+        if isinstance(file_ob, _string_types):
+            file_ob = open_accounting(file_ob)
+        self._file_ob = file_ob
+        self._block_size = block_size
+        self._line_iter = None
         self._row_num = 0
+        self._entry_class = AccountEntry
+        self._profile = profile
+        self._hook = hook
+        self._bytes = 0
+        self._comments = 0
+        self._rejected = 0
+        self._filtered = 0
+        self._detected_rows = {}
+        self._timings = dict((stage, 0.0) for stage in ParseStats.STAGES)
+        self._errors_policy = errors
+        self._max_errors = max_errors
+        #: List of MalformedRowError of the rows skipped so far, when errors is "collect".
+        self.errors = []
+        # Rows of the current block, the offset of its first row and the row number before it, to find the offset
+        # of a malformed row.  _current_offset is set instead when rows are read one at a time.
+        self._block_rows = None
+        self._block_start = 0
+        self._block_row_num = 0
+        self._row_size = len
+        self._current_offset = None
+        self._where = where
+        self._predicates = {}
+        self._index = None
+        self._dialect = None
+        self._dialect_length = None
+        self._dialect_predicate = None
+        self._decode = None
+
+    def _predicate(self, dialect):
+        try:
+            return self._predicates[dialect]
+        except KeyError:
+            predicate = self._predicates[dialect] = _compile_where(self._where, _SGE_INDEXES[dialect])
+            return predicate
 
     def __iter__(self):
         return self
 
-    def next(self):
+    @classmethod
+    def parallel(cls, path, processes=None, chunk_size=64 * 1024 * 1024, func=None, stats=None, error_log=None,
+                 in_flight=None, **kwargs):
+        """
+        Parses the accounting file at path in a pool of worker processes.  The file is split into byte ranges of
+        about chunk_size bytes that end on a newline, each range is parsed by a new instance of this class, and the
+        results are returned in file order.
+
+        Without func every entry is pickled back to this process, which costs about as much as parsing it here, so
+        parallel parsing only pays when func reduces each range in its worker, for example to an
+        :py:class:`gridengine_accounting.aggregate.Aggregator`, whose results can be merged.
+
+        Example::
+
+            >>> from gridengine_accounting import UGEAccountFile
+            >>> for ac in UGEAccountFile.parallel("ug82_accounting", processes=32):
+            ...     print ac.job_number
+            [...]
+
+        :param path: Path to the accounting file.
+        :param processes: Number of worker processes, defaults to the number of CPUs.
+        :param chunk_size: Approximate size in bytes of each range handed to a worker.
+        :param func: Module level function that is given the reader of a range in a worker, its picklable result is
+            returned instead of the entries of the range.
+        :param stats: :py:class:`ParseStats` that the stats of every range are added to.
+        :param error_log: List that the errors collected from every range are added to, when errors is "collect".
+            Error line numbers and offsets are positions in the whole file.
+        :param in_flight: Largest number of ranges parsed or waiting to be returned, defaults to twice processes.
+        :param kwargs: Extra arguments passed to the constructor in each worker, these must be picklable.
+        :return: Generator of the entries of the file, or of the result of func for each range.
+        """
+        jobs = iter([(cls, path, start, end, func, kwargs) for start, end in _split_ranges(path, chunk_size)])
+        in_flight = in_flight or 2 * (processes or multiprocessing.cpu_count())
+        max_errors = kwargs.get("max_errors", 100)
+        pending = collections.deque()
+        rows = 0  # Rows in the ranges before the next one returned, to give error line numbers in the whole file.
+        pool = multiprocessing.Pool(processes)
+        try:
+            while True:
+                while len(pending) < in_flight:
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending.append(pool.apply_async(_parse_range, (job,)))
+                if not pending:
+                    return
+                result, range_stats, errors, error = pending.popleft().get()
+                if stats is not None:
+                    stats.merge(range_stats)
+                if error_log is not None:
+                    room = max(0, max_errors - len(error_log))
+                    error_log.extend(_moved_error(e, rows, 0) for e in errors[:room])
+                if error is not None:
+                    raise _moved_error(error, rows, 0)
+                rows += range_stats.rows
+                if func is not None:
+                    yield result
+                else:
+                    for entry in result:
+                        yield entry
+        finally:
+            pool.terminate()
+
+    @classmethod
+    def follow(cls, path, checkpoint=None, checkpoint_path=None, poll_interval=1.0, save_every=1000, **kwargs):
+        """
+        Returns entries as they are appended to a live accounting file, starting from a checkpoint.  At the end of
+        the file the reader waits poll_interval seconds and tries again, a partly written row is not returned until
+        it is complete.  When the file at path is replaced, as on log rotation, the reader finishes the old file and
+        starts the new one from the beginning.
+
+        The checkpoint is advanced past each entry as it is returned, so a restarted consumer resumes after the last
+        entry it received, and an entry that was received but not processed before a crash is not returned again.
+        When checkpoint_path is given the checkpoint is loaded from it, and saved every save_every entries and
+        whenever the reader reaches the end of the file.
+
+        Example::
+
+            >>> from gridengine_accounting import UGEAccountFile
+            >>> for ac in UGEAccountFile.follow("accounting", checkpoint_path="accounting.checkpoint"):
+            ...     print ac.job_number
+            [...]
+
+        :param path: Path to the accounting file.
+        :param checkpoint: Checkpoint to start from, it is updated in place.
+        :param checkpoint_path: File to load and save the checkpoint from.
+        :param poll_interval: Seconds to wait at the end of the file, or None to stop at the end of the file.
+        :param save_every: Number of entries between checkpoint saves.
+        :param kwargs: Extra arguments passed to the constructor.
+        :return: Generator of entries.
+        """
+        if checkpoint is None:
+            checkpoint = Checkpoint.load(checkpoint_path) if checkpoint_path else Checkpoint()
+        f = None
+        unsaved = 0
+        try:
+            while True:
+                if f is None:
+                    try:
+                        f = open(path, "rb")
+                    except IOError:
+                        if poll_interval is None:
+                            return
+                        time.sleep(poll_interval)
+                        continue
+                    st = os.fstat(f.fileno())
+                    if checkpoint.inode not in (None, st.st_ino) or checkpoint.offset > st.st_size:
+                        checkpoint.offset = 0
+                    checkpoint.inode = st.st_ino
+                    f.seek(checkpoint.offset)
+                    reader = cls(f, **kwargs)
+                    rotated = False
+
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    reader._row_num += 1
+                    reader._current_offset = checkpoint.offset
+                    entry = reader._entry(_text(line))
+                    checkpoint.offset += len(line)  # Before yielding, the entry counts as received once handed over.
+                    if entry is not None:
+                        unsaved += 1
+                        yield entry
+                    if checkpoint_path and unsaved >= save_every:
+                        checkpoint.save(checkpoint_path)
+                        unsaved = 0
+                    continue
+
+                f.seek(checkpoint.offset)  # Partial row, read it again once it is complete.
+                if checkpoint_path:
+                    checkpoint.save(checkpoint_path)
+                    unsaved = 0
+                if poll_interval is None:
+                    return
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    st = None
+                if st is None or st.st_ino != checkpoint.inode:
+                    if not rotated:  # Read anything written to the old file before it was replaced.
+                        rotated = True
+                        continue
+                    f.close()
+                    f = None
+                    checkpoint.offset = 0
+                    checkpoint.inode = None
+                    continue
+                if st.st_size < checkpoint.offset:  # Truncated in place.
+                    checkpoint.offset = 0
+                    f.seek(0)
+                time.sleep(poll_interval)
+        finally:
+            if f is not None:
+                f.close()
+            if checkpoint_path:
+                checkpoint.save(checkpoint_path)
+
+    def lookup(self, job_number, task_number=None):
+        """
+        Returns the entries for a job, or a single task of a job, in file order.  The rows are found through a
+        sidecar index stored next to the accounting file with an .idx suffix, which is built on first use, extended
+        when rows are appended and rebuilt if the file shrinks.  Moves the position of the underlying file object.
+        The file must be uncompressed and opened from a path, ValueError is raised otherwise.
+
+        :param job_number: Job number to find.
+        :param task_number: Optional array task number.
+        :return: Generator of entries.
+        """
+        for offset in self._get_index().lookup(job_number, task_number):
+            entry = self._entry_at(offset)
+            if entry is not None:
+                yield entry
+
+    def range(self, start, end):
+        """
+        Returns the entries whose end_time is between start and end inclusive, ordered by end_time, using the sidecar
+        index as for :py:meth:`lookup`.
+
+        :param start: Earliest end time, in seconds.
+        :param end: Latest end time, in seconds.
+        :return: Generator of entries.
+        """
+        for offset in self._get_index().range(start, end):
+            entry = self._entry_at(offset)
+            if entry is not None:
+                yield entry
+
+    def _get_index(self):
+        if self._index is None:
+            from gridengine_accounting.index import AccountIndex
+            path = _plain_file_path(self._file_ob)
+            if path is None:
+                raise ValueError("lookup() and range() need an uncompressed accounting file opened from a path")
+            self._index = AccountIndex.open(path, self._index_keys)
+        return self._index
+
+    def _entry_at(self, offset):
+        self._file_ob.seek(offset)
+        self._current_offset = offset
+        try:
+            return self._entry(_text(self._file_ob.readline()))
+        finally:
+            self._current_offset = None
+
+    def _index_keys(self, line):
+        """
+        Returns (job_number, task_number, end_time) of a row, or None if it is not an accounting row or its keys can
+        not be converted.
+        """
+        line = _text(line)
+        if line.startswith("#"):
+            return None
+        fields = line.split(":")
+        dialect = _sge_dialect(fields)
+        if dialect is None:
+            return None
+        index = _SGE_INDEXES[dialect]
+        try:
+            return tuple(convert(fields[i]) for i, convert in
+                         (index["job_number"], index["task_number"], index["end_time"]))
+        except (ValueError, IndexError):
+            return None
+
+    @property
+    def dialect(self):
+        """
+        Name of the SGE_DIALECTS dialect of the file: "sge", "sge46", "acct" or "univa", or None until the first
+        accounting row has been read.
+        """
+        return self._dialect
+
+    def _detect(self, fields):
+        """Returns the dialect of a row that does not match the dialect of the file, and sets the file dialect."""
+        dialect = _sge_dialect(fields)
+        if dialect is not None and self._dialect is None:
+            self._dialect = dialect
+            self._dialect_length = len(fields)
+            self._decode = _SGE_DECODERS[dialect]
+            if self._where is not None:
+                self._dialect_predicate = self._predicate(dialect)
+        return dialect
+
+    @property
+    def stats(self):
+        """:py:class:`ParseStats` of the rows read so far."""
+        stats = ParseStats()
+        stats.rows = self._row_num
+        stats.comments = self._comments
+        stats.rejected = self._rejected
+        stats.filtered = self._filtered
+        stats.entries = self._row_num - self._comments - self._rejected - self._filtered
+        stats.bytes = self._bytes
+        stats.dialects = dict(self._detected_rows)
+        # Rows in the layout of the file skip detection, they are the rows not counted anywhere else.
+        matched = stats.rows - stats.comments - stats.rejected - sum(self._detected_rows.values())
+        if matched:
+            dialect = self._dialect or self._fixed_dialect
+            stats.dialects[dialect] = stats.dialects.get(dialect, 0) + matched
+        stats.timings = dict(self._timings)
+        return stats
+
+    def _split(self, line):
+        """Returns the fields of a row and the decoder for them, or None if the row is skipped."""
+        if line.startswith("#"):
+            self._comments += 1
+            return None
+
+        fields = line.rstrip("\n").split(":")
+        if len(fields) == self._dialect_length and (self._dialect != "acct" or fields[1] == "acct"):
+            if self._dialect_predicate is None or self._dialect_predicate(fields):
+                return fields, self._decode
+            self._filtered += 1
+            return None
+
+        dialect = self._detect(fields)
+        if dialect is None:
+            if len(fields) > 1 and fields[1] == "acct":
+                self._reject(line, "acct row with %d fields" % len(fields))
+            elif len(fields) > 1 and fields[0].isdigit() and fields[1].replace("_", "").isalpha():
+                self._rejected += 1  # Another record type in a reporting file.
+            else:
+                self._reject(line, "Unknown row type with %d fields" % len(fields))
+            return None
+        self._detected_rows[dialect] = self._detected_rows.get(dialect, 0) + 1
+        if self._where is None or self._predicate(dialect)(fields):
+            return fields, _SGE_DECODERS[dialect]
+        self._filtered += 1
+        return None
+
+    def _entry(self, line):
+        """Returns the entry for a row, or None if the row is skipped."""
+        try:
+            split = self._split(line)
+            if split is None:
+                return None
+            entry = self._entry_class.__new__(self._entry_class)
+            split[1](entry, split[0])
+            return entry
+        except MalformedRowError:
+            raise
+        except (ValueError, IndexError) as e:
+            self._reject(line, "Invalid value: %s" % e)
+            return None
+
+    def _reject(self, line, reason, line_number=None):
+        """
+        Counts a malformed row and raises, skips or collects it according to the errors policy.  line_number is given
+        for a row found after later rows were read, its offset is then not known.
+        """
+        self._rejected += 1
+        if self._errors_policy == "skip":
+            return
+        if self._errors_policy == "collect" and len(self.errors) >= self._max_errors:
+            return
+        if line_number is None:
+            error = MalformedRowError(reason, self._row_num, self._row_offset(), line)
+        else:
+            error = MalformedRowError(reason, line_number, None, line)
+        if self._errors_policy == "raise":
+            raise error
+        self.errors.append(error)
+
+    def _row_offset(self):
+        """Returns the byte offset of the row being read, or None if it is not known."""
+        if self._current_offset is not None:
+            return self._current_offset
+        if self._block_rows is None:
+            return None
+        index = self._row_num - self._block_row_num - 1
+        return self._block_start + sum(self._row_size(row) + 1 for row in self._block_rows[:index])
+
+    def _lines(self):
+        """Generates the rows of the file without their newlines, reading the file in blocks."""
+        read = self._file_ob.read
+        block_size = self._block_size
+        timings = self._timings
+        try:
+            position = self._file_ob.tell()
+        except (AttributeError, IOError, OSError):
+            position = 0
+        tail = ""
         while True:
+            start = _clock()
+            block = read(block_size)
+            read_end = _clock()
+            timings["read"] += read_end - start
+            if not block:
+                break
+            self._bytes += len(block)
+            if bytes is not str and isinstance(block, bytes):
+                # Only whole rows are decoded, a multibyte character can not contain a newline byte.
+                self._row_size = _text_size
+                data = tail + block if tail else block
+                end = data.rfind(b"\n") + 1
+                lines = data[:end].decode("utf-8", "surrogateescape").split("\n")
+                lines[-1] = data[end:]
+            else:
+                lines = (tail + block).split("\n")
+            self._block_rows = lines
+            self._block_start = position - len(tail)
+            self._block_row_num = self._row_num
+            position += len(block)
+            tail = lines.pop()  # Partial row at the end of the block.
+            timings["split"] += _clock() - read_end
+            if self._hook is not None:
+                self._hook(self.stats)
+            for line in lines:
+                yield line
+        if tail:
+            self._block_start = position - len(tail)
+            tail = _text(tail)
+            self._block_rows = [tail]
+            self._block_row_num = self._row_num
+            yield tail
+        if self._hook is not None:
+            self._hook(self.stats)
+
+    def _next_line(self):
+        """Returns the next row of the file, or None at the end of the file."""
+        if self._line_iter is None:
+            self._line_iter = self._lines()
+        for line in self._line_iter:
             self._row_num += 1
-            line = self._file_ob.readline()
-            if not line:
-                raise StopIteration
-            if line.startswith("#"):
-                continue
+            return line
+        return None
 
-            fields = line.split(":")
-            if len(fields) in [45, 46]:
-                try:
-                    int(fields[0])  # standard SGE row doesnt start with int
-                except ValueError:
-                    return AccountEntry(line)
-            elif len(fields) == 47 and fields[1] == "acct":
-                return AccountEntry(line)
-            elif len(fields) == 39:
-                return AccountEntry(line)
-            else:
-                if fields[1] == "acct":
-                    print "ERROR: Invalid length of accounting row, this is probably a big deal"
-                print "Unknown Row Type: %d at line %d" % (len(fields), self._row_num)
+    def next(self):
+        if self._line_iter is None:
+            self._line_iter = self._lines()
+        if self._profile:
+            return self._profiled_next()
+        for line in self._line_iter:
+            self._row_num += 1
+            entry = self._entry(line)
+            if entry is not None:
+                return entry
+        raise StopIteration
+
+    def _profiled_next(self):
+        """next(), timing the split, construct and convert stages of each row."""
+        timings = self._timings
+        cls = self._entry_class
+        for line in self._line_iter:
+            self._row_num += 1
+            try:
+                start = _clock()
+                split = self._split(line)
+                split_end = _clock()
+                timings["split"] += split_end - start
+                if split is not None:
+                    entry = cls.__new__(cls)
+                    construct_end = _clock()
+                    split[1](entry, split[0])
+                    timings["construct"] += construct_end - split_end
+                    timings["convert"] += _clock() - construct_end
+                    return entry
+            except MalformedRowError:
+                raise
+            except (ValueError, IndexError) as e:
+                self._reject(line, "Invalid value: %s" % e)
+        raise StopIteration
+
+    def __next__(self):
+        return self.next()
 
 
 class UGEAccountFile(AccountFile):
     """
     Iterator that returns a new UGEAccountEntry object for every valid row in an
-    Univa Grid Engine Accounting file.
+    Univa Grid Engine Accounting file.  When lazy is True a LazyUGEAccountEntry is returned instead, which only
+    converts the fields that are read.  Rows can be filtered before any entry is built by passing where, as for
+    AccountFile.  Malformed rows are handled as for AccountFile, except that errors defaults to "raise".
 
     Example::
 
@@ -64,15 +1134,45 @@ class UGEAccountFile(AccountFile):
         [...]
 
     """
-    def next(self):
-        while True:
-            self._row_num += 1
-            line = self._file_ob.readline()
-            if not line:
-                raise StopIteration
-            if line.startswith("#"):
-                continue
-            return UGEAccountEntry(line)
+    _fixed_dialect = "uge"
+
+    def __init__(self, file_ob, lazy=False, where=None, block_size=BLOCK_SIZE, profile=False, hook=None,
+                 errors="raise", max_errors=100):
+        AccountFile.__init__(self, file_ob, where=where, block_size=block_size, profile=profile, hook=hook,
+                             errors=errors, max_errors=max_errors)
+        self._where = _compile_where(where, _UGE_INDEX)
+        if lazy:
+            self._entry_class = LazyUGEAccountEntry
+            self._decode = _keep_fields
+        else:
+            self._entry_class = UGEAccountEntry
+            self._decode = _decode_uge
+
+    def _index_keys(self, line):
+        line = _text(line)
+        if line.startswith("#"):
+            return None
+        fields = line.split(":")
+        if len(fields) != len(UGE_FIELDS):
+            return None
+        try:
+            return tuple(convert(fields[i]) for i, convert in
+                         (_UGE_INDEX["job_number"], _UGE_INDEX["task_number"], _UGE_INDEX["end_time"]))
+        except (ValueError, IndexError):
+            return None
+
+    def _split(self, line):
+        if line.startswith("#"):
+            self._comments += 1
+            return None
+        fields = line.rstrip("\n").split(":")
+        if len(fields) != len(UGE_FIELDS):
+            self._reject(line, "Line contains invalid number of fields")
+            return None
+        if self._where is not None and not self._where(fields):
+            self._filtered += 1
+            return None
+        return fields, self._decode
 
 
 class UGEAccountEntry(object):
@@ -301,76 +1401,22 @@ class UGEAccountEntry(object):
 
         The command line used for job submission.
 
+    The submission_time, start_time, end_time, ru_wallclock and ar_submission_time attributes are in seconds, each
+    is also available in milliseconds as the computed attribute of the same name with a _milliseconds suffix.
     """
+    __slots__ = tuple(name for name, kind in UGE_FIELDS)
+
+    submission_time_milliseconds = _milliseconds_property("submission_time")
+    start_time_milliseconds = _milliseconds_property("start_time")
+    end_time_milliseconds = _milliseconds_property("end_time")
+    ru_wallclock_milliseconds = _milliseconds_property("ru_wallclock")
+    ar_submission_time_milliseconds = _milliseconds_property("ar_submission_time")
+
     def __init__(self, line):
-        fields = line.split(":")
+        fields = line.rstrip("\n").split(":")
         if len(fields) != 52:
             raise ValueError("Line contains invalid number of fields")
-
-        self.qname = fields.pop(0)
-        self.hostname = fields.pop(0)
-        self.group = fields.pop(0)
-        self.owner = fields.pop(0)
-        self.job_name = fields.pop(0)
-        self.job_number = int(fields.pop(0))
-        self.account = fields.pop(0)
-        self.priority = int(fields.pop(0))
-        self.submission_time = int(fields.pop(0))
-        self.submission_time_milliseconds = self.submission_time
-        self.submission_time = float(self.submission_time)/1000
-        self.start_time = int(fields.pop(0))
-        self.start_time_milliseconds = int(self.start_time)
-        self.start_time = float(self.start_time)/1000
-        self.end_time = int(fields.pop(0))
-        self.end_time_milliseconds = int(self.end_time)
-        self.end_time = float(self.end_time)/1000
-        self.failed = int(fields.pop(0))
-        self.exit_status = int(fields.pop(0))
-        self.ru_wallclock = fields.pop(0)
-        self.ru_wallclock_milliseconds = self.ru_wallclock
-        self.ru_wallclock = float(self.ru_wallclock) / 1000
-
-        self.ru_utime = float(fields.pop(0))
-        self.ru_stime = float(fields.pop(0))
-        self.ru_maxrss = float(fields.pop(0))
-        self.ru_ixrss = float(fields.pop(0))
-        self.ru_ismrss = float(fields.pop(0))
-        self.ru_idrss = float(fields.pop(0))
-        self.ru_isrss = float(fields.pop(0))
-        self.ru_minflt = float(fields.pop(0))
-        self.ru_majflt = float(fields.pop(0))
-        self.ru_nswap = float(fields.pop(0))
-        self.ru_inblock = float(fields.pop(0))
-        self.ru_oublock = float(fields.pop(0))
-        self.ru_msgsnd = float(fields.pop(0))
-        self.ru_msgrcv = float(fields.pop(0))
-        self.ru_nsignals = float(fields.pop(0))
-        self.ru_nvcsw = float(fields.pop(0))
-        self.ru_nivcsw = float(fields.pop(0))
-        self.project = fields.pop(0)
-        self.department = fields.pop(0)
-        self.granted_pe = fields.pop(0)
-        self.slots = int(fields.pop(0))
-        self.task_number = int(fields.pop(0))
-        self.cpu = float(fields.pop(0))
-        self.mem = float(fields.pop(0))
-        self.io = float(fields.pop(0))
-        self.category = fields.pop(0)
-        self.iow = float(fields.pop(0))
-        self.pe_taskid = fields.pop(0)
-        self.maxvmem = int(fields.pop(0))
-        self.arid = int(fields.pop(0))
-        self.ar_submission_time = int(fields.pop(0))
-        self.ar_submission_time_milliseconds = self.ar_submission_time
-        self.ar_submission_time = float(self.ar_submission_time) / 1000
-        self.job_class = fields.pop(0)
-        self.qdel_info = fields.pop(0)
-        self.maxrss = int(fields.pop(0))
-        self.maxpss = int(fields.pop(0))
-        self.submit_host = fields.pop(0)
-        self.cwd = fields.pop(0)
-        self.submit_cmd = fields.pop(0)
-        self.submit_cmd.replace("\255", ":")
+        _decode_uge(self, fields)
 
     def to_dict(self):
         """
@@ -379,92 +1425,65 @@ class UGEAccountEntry(object):
         :return: Accounting entry as dictionary.
         :rtype: dict
         """
-        return self.__dict__
+        d = {}
+        for name, kind in UGE_FIELDS:
+            d[name] = getattr(self, name)
+            if kind == "ms":
+                d[name + "_milliseconds"] = getattr(self, name + "_milliseconds")
+        return d
 
-class AccountEntry:
-    def __init__(self, line):
-        lines = line.split(":")
+    def __getstate__(self):
+        return _uge_state(self)
 
-        if len(lines) not in [45, 46, 47, 39]:
-            raise ValueError("Line not of correct format")
-        if len(lines) == 47:  # Remove type and timestime fields.
-            lines.pop(0)
-            lines.pop(0)
-        self._qname = lines.pop(0)
-        self._hostname = lines.pop(0)
-        self._group = lines.pop(0)
-        self._owner = lines.pop(0)
-        self._job_name = lines.pop(0)
-        self._job_number = int(lines.pop(0))
-        self._account = lines.pop(0)
-        self._priority = int(lines.pop(0))
-        self._submission_time = int(lines.pop(0))
-        self._start_time = int(lines.pop(0))
-        self._end_time = int(lines.pop(0))
-        self._failed = int(lines.pop(0))
-
-        if len(lines) == 39:
-            self._exit_status = 0  # Not present in base for univa UD
-        else:
-            self._exit_status = int(lines.pop(0))
-
-        self._ru_wallclock = int(lines.pop(0))
-        self._ru_utime = float(lines.pop(0))
-        self._ru_stime = float(lines.pop(0))
-        self._ru_maxrss = float(lines.pop(0))
-        self._ru_ixrss = float(lines.pop(0))
-        self._ru_ismrss = float(lines.pop(0))
-        self._ru_idrss = float(lines.pop(0))
-        self._ru_isrss = float(lines.pop(0))
-        self._ru_minflt = float(lines.pop(0))
-        self._ru_majflt = float(lines.pop(0))
-        self._ru_nswap = float(lines.pop(0))
-        self._ru_inblock = float(lines.pop(0))
-        self._ru_oublock = float(lines.pop(0))
-        self._ru_msgsnd = float(lines.pop(0))
-        self._ru_msgrcv = float(lines.pop(0))
-        self._ru_nsignals = float(lines.pop(0))
-        self._ru_nvcsw = float(lines.pop(0))
-        self._ru_nivcsw = float(lines.pop(0))
-        self._project = lines.pop(0)
-        if self._project == "NONE":
-            self._project = None
-        self._department = lines.pop(0)
-        if self._department == "NONE":
-            self._department = None
-        self._granted_pe = lines.pop(0)
-        if self._granted_pe == "NONE":
-            self._granted_pe = None
-        self._slots = int(lines.pop(0))
-        self._task_number = int(lines.pop(0))
-        self._cpu = float(lines.pop(0))
-        self._mem = float(lines.pop(0))
-        self._io = float(lines.pop(0))
-
-        self._catagory = lines.pop(0)
-        if self._catagory == "NONE":
-            self._catagory = None
-        if len(lines) in [45, 46]:
-            self._iow = float(lines.pop(0))
-        else:
-            self._iow = 0.0  # Not present in Univa UD
+    def __setstate__(self, state):
+        _restore_uge(self, state)
 
-        self._pe_taskid = None  # Not present in Univa UD
-        if len(lines) in [45, 46]:
-            try:
-                self._pe_taskid = int(lines.pop(0))
-            except ValueError:
-                pass
 
-        self._maxvmem = 0.0
-        if len(lines) in [45, 46]:
-            self._maxvmem = (lines.pop(0))
+def _keep_fields(entry, fields):
+    """Decoder for LazyUGEAccountEntry, which converts fields when they are read."""
+    entry._fields = fields
 
-        self._arid = 0  # Not present in Univa UD
-        if len(lines) in [45, 46]:
-            self._arid = int(lines.pop(0))
 
-        self._ar_submission_time = float(lines.pop(0))
+class LazyUGEAccountEntry(UGEAccountEntry):
+    """
+    A UGEAccountEntry that keeps the split row and converts each field the first time its attribute is read, the
+    converted value is then cached on the object.  Use this when only a few of the 52 fields are needed.
+    """
+    __slots__ = ("_fields",)
+
+    def __init__(self, line):
+        fields = line.rstrip("\n").split(":")
+        if len(fields) != 52:
+            raise ValueError("Line contains invalid number of fields")
+        self._fields = fields
+
+    def __getattr__(self, name):
+        try:
+            index, convert = _UGE_INDEX[name]
+        except KeyError:
+            raise AttributeError(name)
+        value = convert(self._fields[index])
+        setattr(self, name, value)
+        return value
+
+
+class AccountEntry(object):
+    __slots__ = (
+        "_qname", "_hostname", "_group", "_owner", "_job_name", "_job_number", "_account", "_priority",
+        "_submission_time", "_start_time", "_end_time", "_failed", "_exit_status", "_ru_wallclock", "_ru_utime",
+        "_ru_stime", "_ru_maxrss", "_ru_ixrss", "_ru_ismrss", "_ru_idrss", "_ru_isrss", "_ru_minflt", "_ru_majflt",
+        "_ru_nswap", "_ru_inblock", "_ru_oublock", "_ru_msgsnd", "_ru_msgrcv", "_ru_nsignals", "_ru_nvcsw",
+        "_ru_nivcsw", "_project", "_department", "_granted_pe", "_slots", "_task_number", "_cpu", "_mem", "_io",
+        "_catagory", "_iow", "_pe_taskid", "_maxvmem", "_arid", "_ar_submission_time",
+    )
+
+    def __init__(self, line):
+        fields = line.rstrip("\n").split(":")
+        try:
+            decode = _SGE_DECODERS[_SGE_DIALECT_BY_LENGTH[len(fields)]]
+        except KeyError:
+            raise ValueError("Line not of correct format")
+        decode(self, fields)
 
     @property
     def queue_name(self):
@@ -675,6 +1694,11 @@ class AccountEntry:
         """The integral memory usage in Gbytes cpu seconds."""
         return self._mem
 
+    @property
+    def io(self):
+        """The amount of data transferred in input/output operations."""
+        return self._io
+
     @property
     def catagory(self):
         """A string specifying the job category."""
@@ -713,7 +1737,13 @@ class AccountEntry:
 
     def to_dict(self):
         d = {}
-        for k, v in self.__dict__.iteritems():
-            k = k.lstrip("_")
-            d[k] = v
-        return d
\ No newline at end of file
+        for k in self.__slots__:
+            d[k.lstrip("_")] = getattr(self, k)
+        return d
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self.__slots__)
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
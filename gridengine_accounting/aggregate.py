@@ -0,0 +1,213 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Single pass group by and sum over accounting entries or column batches, for chargeback rollups.
+"""
+import operator
+
+from gridengine_accounting import columnar
+
+DAY = 86400
+
+
+def slot_seconds(entry):
+    """Wallclock time multiplied by the number of slots, works on entries and on column batches."""
+    return entry.ru_wallclock * entry.slots
+
+DEFAULT_METRICS = {
+    "cpu": "cpu",
+    "mem": "mem",
+    "io": "io",
+    "slot_seconds": slot_seconds,
+}
+
+
+class _ColumnView(object):
+    """Gives attribute access to a dict of column arrays, so metric functions work on entries and batches alike."""
+    def __init__(self, columns):
+        self.__dict__.update(columns)
+
+
+class Aggregator(object):
+    """
+    Sums metrics over accounting entries grouped by one or more attributes, and optionally by time interval, in a
+    single pass.  Memory use depends only on the number of groups.
+
+    Metrics are given as a dict of name to either an attribute name or a function of an entry.  Functions should
+    only use arithmetic on attributes, such as :py:func:`slot_seconds`, so they also work on column batches.  Each
+    group also counts its rows.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.aggregate import Aggregator, DAY
+        >>> aggregator = Aggregator(group_by=["owner", "project"], interval=DAY)
+        >>> aggregator.update(UGEAccountFile(open("ug82_accounting"), lazy=True))
+        >>> for row in aggregator.rows():
+        ...     print row["interval_start"], row["owner"], row["slot_seconds"]
+        [...]
+
+    :param group_by: Attribute names to group by.
+    :param metrics: Dict of metric name to attribute name or function, defaults to DEFAULT_METRICS.
+    :param interval: Length of the time interval in seconds, or None to not group by time.
+    :param time_field: Attribute that places an entry in an interval.
+    """
+    def __init__(self, group_by=("owner",), metrics=None, interval=None, time_field="end_time"):
+        self._configure(group_by, metrics, interval, time_field)
+        self.groups = {}
+
+    def _configure(self, group_by, metrics, interval, time_field):
+        self.group_by = list(group_by)
+        self.metrics = dict(metrics or DEFAULT_METRICS)
+        self.interval = interval
+        self.time_field = time_field
+        self._names = sorted(self.metrics)
+        self._metric_getters = [self._getter(self.metrics[name]) for name in self._names]
+        fields = self.group_by
+        if interval:
+            fields = [time_field] + fields
+        self._key_getter = operator.attrgetter(*fields) if fields else lambda entry: ()
+        self._single_field = len(fields) == 1
+
+    def __getstate__(self):
+        # The attrgetters can not be pickled, they are rebuilt from the configuration.  Metric functions must be
+        # module level functions.
+        return self.group_by, self.metrics, self.interval, self.time_field, self.groups
+
+    def __setstate__(self, state):
+        group_by, metrics, interval, time_field, groups = state
+        self._configure(group_by, metrics, interval, time_field)
+        self.groups = groups
+
+    @staticmethod
+    def _getter(metric):
+        if callable(metric):
+            return metric
+        return operator.attrgetter(metric)
+
+    def _key(self, entry):
+        key = self._key_getter(entry)
+        if self._single_field:
+            key = (key,)
+        if self.interval:
+            key = (int(key[0] // self.interval) * self.interval,) + key[1:]
+        return key
+
+    def _accumulate(self, key, rows, values):
+        try:
+            group = self.groups[key]
+        except KeyError:
+            group = self.groups[key] = [0] + [0] * len(values)
+        group[0] += rows
+        for i, value in enumerate(values):
+            group[i + 1] += value
+
+    def add(self, entry):
+        """Adds one entry."""
+        self._accumulate(self._key(entry), 1, [getter(entry) for getter in self._metric_getters])
+
+    def update(self, entries):
+        """Adds every entry from an iterable, such as an AccountFile or UGEAccountFile."""
+        key = self._key
+        getters = self._metric_getters
+        groups = self.groups
+        for entry in entries:
+            k = key(entry)
+            try:
+                group = groups[k]
+            except KeyError:
+                group = groups[k] = [0] * (len(getters) + 1)
+            group[0] += 1
+            for i, getter in enumerate(getters):
+                group[i + 1] += getter(entry)
+
+    def add_columns(self, columns):
+        """
+        Adds a batch of rows from a dict of column arrays, such as one returned by
+        :py:class:`gridengine_accounting.columnar.UGEColumnReader`.  Grouping and sums are done with NumPy.
+        """
+        numpy = columnar.numpy
+        if numpy is None:
+            raise ImportError("add_columns requires numpy")
+        keys = [columns[name] for name in self.group_by]
+        if self.interval:
+            start = numpy.floor_divide(columns[self.time_field], self.interval) * self.interval
+            keys.insert(0, start.astype("int64"))
+        if not keys:
+            keys = [numpy.zeros(len(columns["job_number"]), dtype="int64")]
+        if not len(keys[0]):
+            return
+
+        combined = numpy.zeros(len(keys[0]), dtype="int64")
+        uniques = []
+        for key in keys:
+            values, codes = numpy.unique(key, return_inverse=True)
+            uniques.append(values.tolist())
+            combined = combined * len(values) + codes
+        group_codes, group_index = numpy.unique(combined, return_inverse=True)
+
+        view = _ColumnView(columns)
+        counts = numpy.bincount(group_index, minlength=len(group_codes)).tolist()
+        sums = []
+        for getter in self._metric_getters:
+            values = numpy.broadcast_to(getter(view), group_index.shape)
+            sums.append(numpy.bincount(group_index, weights=values, minlength=len(group_codes)).tolist())
+
+        for g, code in enumerate(group_codes.tolist()):
+            key = []
+            for values in reversed(uniques):
+                code, i = divmod(code, len(values))
+                key.append(values[i])
+            key.reverse()
+            if not self.group_by and not self.interval:
+                key = []
+            self._accumulate(tuple(key), counts[g], [s[g] for s in sums])
+
+    def merge(self, other):
+        """Adds the groups of another Aggregator with the same configuration, such as one run on another file."""
+        for key, group in other.groups.items():
+            self._accumulate(key, group[0], group[1:])
+
+    def results(self):
+        """
+        Returns the totals of each group.
+
+        :return: Dict of group key tuple, (interval_start,) + group_by values, to a dict of metric name to total.
+        :rtype: dict
+        """
+        results = {}
+        for key, group in self.groups.items():
+            totals = dict(zip(self._names, group[1:]))
+            totals["rows"] = group[0]
+            results[key] = totals
+        return results
+
+    def rows(self):
+        """
+        Returns the totals as flat dicts with the group values and metric totals, sorted by group key.
+
+        :rtype: list
+        """
+        names = self.group_by
+        if self.interval:
+            names = ["interval_start"] + names
+        rows = []
+        for key, totals in sorted(self.results().items()):
+            row = dict(zip(names, key))
+            row.update(totals)
+            rows.append(row)
+        return rows
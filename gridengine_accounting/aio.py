@@ -0,0 +1,209 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Reading accounting files from asyncio applications without blocking the event loop.
+
+Readers are run in an executor a batch of entries at a time, with a bounded number of batches read ahead, so a
+slow consumer stops the reading instead of letting batches pile up.  Stages can be used with ``async for``, or a
+batch at a time through their next_batch method.  This module needs Python 3.  Readers given a path, or a file
+opened in binary mode, decode rows as UTF-8.  It is written with futures rather than async syntax so the package
+still compiles on Python 2.
+"""
+import collections
+import itertools
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+class _AsyncBatches(object):
+    """Gives ``async for`` over single entries to a stage that has next_batch."""
+    _loop = None
+    _current = iter(())
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        future = self._loop.create_future()
+        for entry in self._current:
+            future.set_result(entry)
+            return future
+
+        def batch_done(batch_future):
+            if future.cancelled():
+                return
+            if batch_future.exception() is not None:
+                future.set_exception(batch_future.exception())
+                return
+            self._current = iter(batch_future.result())
+            future.set_result(next(self._current))
+        self.next_batch().add_done_callback(batch_done)
+        return future
+
+
+class AsyncAccountFile(_AsyncBatches):
+    """
+    Asynchronous iterator over the entries of an AccountFile, UGEAccountFile or any other iterable of entries.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.aio import AsyncAccountFile
+        >>> async def jobs():
+        ...     async for ac in AsyncAccountFile(UGEAccountFile(open("ug82_accounting"))):
+        ...         print(ac.job_number)
+        [...]
+
+    :param reader: Iterable of entries, it is only iterated in the executor.
+    :param batch_size: Number of entries read per call into the executor.
+    :param read_ahead: Largest number of batches read and not yet consumed.
+    :param executor: concurrent.futures executor, or None for the loop's default executor.
+    :param loop: Event loop, defaults to the running loop, so without it the reader must be created in a coroutine.
+    """
+    def __init__(self, reader, batch_size=1000, read_ahead=4, executor=None, loop=None):
+        if asyncio is None:
+            raise ImportError("AsyncAccountFile requires asyncio")
+        self._reader = iter(reader)
+        self._batch_size = batch_size
+        self._read_ahead = read_ahead
+        self._executor = executor
+        if loop is None:
+            # get_event_loop is deprecated outside a running loop, get_running_loop is new in Python 3.7.
+            get_loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)
+            loop = get_loop()
+        self._loop = loop
+        self._batches = collections.deque()
+        self._reading = None
+        self._waiter = None
+        self._error = None
+        self._done = False
+
+    def _read(self):
+        return list(itertools.islice(self._reader, self._batch_size))
+
+    def _fill(self):
+        if self._reading is None and not self._done and self._error is None \
+                and len(self._batches) < self._read_ahead:
+            self._reading = self._loop.run_in_executor(self._executor, self._read)
+            self._reading.add_done_callback(self._read_done)
+
+    def _read_done(self, reading):
+        self._reading = None
+        if reading.cancelled():
+            self._error = asyncio.CancelledError()
+        elif reading.exception() is not None:
+            self._error = reading.exception()
+        elif not reading.result():
+            self._done = True
+        else:
+            self._batches.append(reading.result())
+        if self._waiter is not None:
+            waiter = self._waiter
+            self._waiter = None
+            self._deliver(waiter)
+        self._fill()
+
+    def _deliver(self, future):
+        if future.cancelled():
+            return
+        if self._batches:
+            future.set_result(self._batches.popleft())
+        elif self._error is not None:
+            future.set_exception(self._error)
+        else:
+            future.set_exception(StopAsyncIteration())
+
+    def next_batch(self):
+        """
+        Returns a future of the next list of entries, which raises StopAsyncIteration at the end of the file.
+        """
+        future = self._loop.create_future()
+        if self._batches or self._error is not None or self._done:
+            self._deliver(future)
+        else:
+            self._waiter = future
+        self._fill()
+        return future
+
+
+class AsyncFilter(_AsyncBatches):
+    """
+    Stage that passes on only the entries for which predicate returns True.
+
+    :param source: AsyncAccountFile or another stage.
+    :param predicate: Function of an entry.
+    """
+    def __init__(self, source, predicate):
+        self._source = source
+        self._predicate = predicate
+        self._loop = source._loop
+
+    def next_batch(self):
+        """Returns a future of the next non empty list of matching entries, as for AsyncAccountFile."""
+        future = self._loop.create_future()
+
+        def batch_done(batch_future):
+            if future.cancelled():
+                return
+            if batch_future.exception() is not None:
+                future.set_exception(batch_future.exception())
+                return
+            batch = [entry for entry in batch_future.result() if self._predicate(entry)]
+            if batch:
+                future.set_result(batch)
+            else:
+                self._source.next_batch().add_done_callback(batch_done)
+        self._source.next_batch().add_done_callback(batch_done)
+        return future
+
+
+def aggregate(source, aggregator):
+    """
+    Feeds every entry of a stage to an object with an update method, such as an
+    :py:class:`gridengine_accounting.aggregate.Aggregator`, a batch at a time.  Batches are only requested once the
+    previous one has been added.
+
+    Example::
+
+        >>> aggregator = await aggregate(AsyncAccountFile(UGEAccountFile(open("ug82_accounting"))), Aggregator())
+
+    :param source: AsyncAccountFile or another stage.
+    :param aggregator: Object whose update method takes a list of entries.
+    :return: Future of aggregator, done when the source is exhausted.
+    """
+    future = source._loop.create_future()
+
+    def batch_done(batch_future):
+        if future.cancelled():
+            return
+        error = batch_future.exception()
+        if isinstance(error, StopAsyncIteration):
+            future.set_result(aggregator)
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            try:
+                aggregator.update(batch_future.result())
+            except Exception as e:
+                future.set_exception(e)
+                return
+            source.next_batch().add_done_callback(batch_done)
+    source.next_batch().add_done_callback(batch_done)
+    return future
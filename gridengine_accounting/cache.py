@@ -0,0 +1,162 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Binary column cache of parsed accounting files, so reports that are run again against the same file skip parsing.
+
+A cache is a directory holding one NumPy .npy file per column, which are memory mapped when the cache is read,
+and a meta.json file recording the size and modification time of the accounting file the cache was built from.  For
+a compressed file these are of the compressed file, so a monthly archive is not decompressed to check its cache.
+"""
+import json
+import os
+
+from gridengine_accounting import SGE_FIELDS, UGEAccountFile, open_accounting
+from gridengine_accounting import columnar
+
+VERSION = 1
+
+_META = "meta.json"
+
+
+class StaleCacheError(ValueError):
+    """Raised when a cache does not match its accounting file."""
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def entry_columns(entries, fields):
+    """
+    Builds a dict of column arrays from entry objects.  In string columns None is stored as an empty string, and
+    in optional integer columns such as pe_taskid None is stored as -1.
+
+    :param entries: Iterable of UGEAccountEntry or AccountEntry objects.
+    :param fields: Field table describing the entries, UGE_FIELDS or SGE_FIELDS.
+    :return: Dict of column name to NumPy array.
+    :rtype: dict
+    """
+    values = dict((name, []) for name, kind in fields)
+    for entry in entries:
+        d = entry.to_dict()
+        for name, kind in fields:
+            values[name].append(d[name])
+    columns = {}
+    for name, kind in fields:
+        column = values[name]
+        if kind in ("str", "none"):
+            columns[name] = columnar.numpy.array(["" if v is None else v for v in column], dtype="S")
+        elif kind == "optional_int":
+            columns[name] = columnar.numpy.array([-1 if v is None else v for v in column], dtype="int64")
+        else:
+            columns[name] = columnar.numpy.array(column, dtype=columnar.DTYPES[kind])
+    return columns
+
+
+def write_cache(columns, cache_dir, source=None):
+    """
+    Writes a dict of column arrays to a cache directory.
+
+    :param columns: Dict of column name to NumPy array.
+    :param cache_dir: Directory to write, it is created if needed.
+    :param source: Path of the accounting file the columns were read from, its size and mtime are recorded.
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    meta_path = os.path.join(cache_dir, _META)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    for name, array in columns.items():
+        columnar.numpy.save(os.path.join(cache_dir, name + ".npy"), array)
+    meta = {
+        "version": VERSION,
+        "columns": sorted(columns),
+        "source": _stamp(source) if source else None,
+    }
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.rename(meta_path + ".tmp", meta_path)
+
+
+def read_cache(cache_dir, source=None):
+    """
+    Reads a cache directory, each column is memory mapped read only.
+
+    :param cache_dir: Directory written by :py:func:`write_cache`.
+    :param source: Path of the accounting file, if given the cache must have been built from it as it is now.
+    :return: Dict of column name to NumPy array.
+    :rtype: dict
+    :raises StaleCacheError: The cache is missing, incomplete, or out of date.
+    """
+    meta_path = os.path.join(cache_dir, _META)
+    if not os.path.exists(meta_path):
+        raise StaleCacheError("No cache in %s" % cache_dir)
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta["version"] != VERSION:
+        raise StaleCacheError("Cache version %s is not supported" % meta["version"])
+    if source is not None and meta["source"] != _stamp(source):
+        raise StaleCacheError("Cache in %s is out of date for %s" % (cache_dir, source))
+    columns = {}
+    for name in meta["columns"]:
+        columns[name] = columnar.numpy.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="r")
+    return columns
+
+
+def build_cache(path, cache_dir=None, reader_class=UGEAccountFile):
+    """
+    Parses an accounting file and writes its cache.  UGE files are read with :py:class:`UGEColumnReader`, other
+    readers go through their entry objects.
+
+    :param path: Path to the accounting file, it is opened with :py:func:`open_accounting` so it may be compressed.
+    :param cache_dir: Cache directory, defaults to path with a .cache suffix.
+    :param reader_class: UGEAccountFile, AccountFile, or a subclass of either.
+    :return: Dict of column name to memory mapped NumPy array.
+    :rtype: dict
+    """
+    if columnar.numpy is None:
+        raise ImportError("The accounting cache requires numpy")
+    cache_dir = cache_dir or path + ".cache"
+    with open_accounting(path) as f:
+        if issubclass(reader_class, UGEAccountFile):
+            columns = columnar.read_columns(f)
+        else:
+            columns = entry_columns(reader_class(f), SGE_FIELDS)
+    write_cache(columns, cache_dir, source=path)
+    return read_cache(cache_dir, source=path)
+
+
+def open_cache(path, cache_dir=None, reader_class=UGEAccountFile):
+    """
+    Returns the columns of an accounting file from its cache, building the cache first if it is missing or the
+    accounting file has changed.  Arguments are as for :py:func:`build_cache`.
+
+    Example::
+
+        >>> from gridengine_accounting.cache import open_cache
+        >>> columns = open_cache("ug82_accounting")
+        >>> print columns["cpu"].sum()
+        0.008
+
+    :rtype: dict
+    """
+    cache_dir = cache_dir or path + ".cache"
+    try:
+        return read_cache(cache_dir, source=path)
+    except StaleCacheError:
+        return build_cache(path, cache_dir, reader_class)
@@ -0,0 +1,189 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Read Univa Grid Engine accounting files into NumPy column arrays instead of one object per row.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from gridengine_accounting import MalformedRowError, UGEAccountFile, UGE_FIELDS
+
+DTYPES = {
+    "str": None,
+    "int": "int64",
+    "float": "float64",
+    "ms": "float64",
+}
+
+
+# Python conversion of each numeric kind, used to find the bad rows of a batch that NumPy could not convert.
+_CHECKS = {
+    "int": int,
+    "float": float,
+    "ms": float,
+}
+
+
+def _to_array(values, kind):
+    if not values:
+        return numpy.array([], dtype=DTYPES[kind] or "S1")
+    array = numpy.array(values)
+    if kind == "str":
+        return array
+    array = array.astype(DTYPES[kind])
+    if kind == "ms":
+        array /= 1000
+    return array
+
+
+def build_columns(rows):
+    """
+    Converts a list of split accounting rows to a dict of typed column arrays, one per UGE_FIELDS entry.
+
+    :param rows: List of rows, each a list of 52 string fields.
+    :return: Dict of column name to NumPy array.
+    :rtype: dict
+    """
+    values = list(zip(*rows)) or [()] * len(UGE_FIELDS)
+    columns = {}
+    for (name, kind), column in zip(UGE_FIELDS, values):
+        columns[name] = _to_array(column, kind)
+    return columns
+
+
+def to_structured(columns):
+    """
+    Packs a dict of column arrays into a single NumPy structured array with one record per row.
+
+    :param columns: Dict of column arrays as returned by :py:func:`build_columns`.
+    :return: Structured array, fields in accounting file order.
+    :rtype: numpy.ndarray
+    """
+    dtype = [(name, columns[name].dtype) for name, kind in UGE_FIELDS]
+    array = numpy.empty(len(columns["job_number"]), dtype=dtype)
+    for name, kind in UGE_FIELDS:
+        array[name] = columns[name]
+    return array
+
+
+class UGEColumnReader(UGEAccountFile):
+    """
+    Iterator that returns a dict of NumPy column arrays for every batch of *rows* valid rows in a Univa Grid Engine
+    Accounting file.  Each dict has one array per :py:class:`UGEAccountEntry` attribute, times are converted to
+    seconds as they are on the entry objects.
+
+    Example::
+
+        >>> from gridengine_accounting.columnar import UGEColumnReader
+        >>> f = open("ug82_accounting")
+        >>> for columns in UGEColumnReader(f, rows=100000):
+        ...     print columns["cpu"].sum()
+        [...]
+
+    Rows can be filtered with where, and malformed rows handled with errors, as for UGEAccountFile.  A row with a
+    value that can not be converted is found when its batch is converted, so its offset is not known.
+    """
+    def __init__(self, file_ob, rows=100000, **kwargs):
+        if numpy is None:
+            raise ImportError("UGEColumnReader requires numpy")
+        UGEAccountFile.__init__(self, file_ob, **kwargs)
+        self._rows = rows
+
+    def next(self):
+        while True:
+            rows, row_nums = self._read_batch()
+            if not rows:
+                raise StopIteration
+            try:
+                return build_columns(rows)
+            except ValueError:
+                rows = self._valid_rows(rows, row_nums)
+                if rows:
+                    return build_columns(rows)
+
+    def _read_batch(self):
+        """Returns the split fields and row numbers of the next batch of rows."""
+        rows = []
+        row_nums = []
+        while self._rows is None or len(rows) < self._rows:
+            line = self._next_line()
+            if line is None:
+                break
+            try:
+                split = self._split(line)
+            except MalformedRowError:
+                raise
+            except (ValueError, IndexError) as e:
+                self._reject(line, "Invalid value: %s" % e)
+                continue
+            if split is not None:
+                rows.append(split[0])
+                row_nums.append(self._row_num)
+        return rows, row_nums
+
+    def _valid_rows(self, rows, row_nums):
+        """Returns the rows whose numeric fields all convert, rejecting the others."""
+        checks = [(i, name, _CHECKS[kind]) for i, (name, kind) in enumerate(UGE_FIELDS) if kind in _CHECKS]
+        valid = []
+        for fields, row_num in zip(rows, row_nums):
+            for i, name, check in checks:
+                try:
+                    check(fields[i])
+                except ValueError:
+                    self._reject(":".join(fields), "Invalid value of %s: %r" % (name, fields[i]), row_num)
+                    break
+            else:
+                valid.append(fields)
+        return valid
+
+
+def read_columns(file_ob, rows=None):
+    """
+    Parses a Univa Grid Engine accounting file into a dict of typed column arrays.  The file is read ahead in
+    blocks, so when rows is given its position afterwards may be past the last row returned.
+
+    :param file_ob: Open accounting file.
+    :param rows: Number of rows to read, or None to read the rest of the file.
+    :return: Dict of column name to NumPy array.
+    :rtype: dict
+    """
+    if rows is not None:
+        try:
+            return UGEColumnReader(file_ob, rows=rows).next()
+        except StopIteration:
+            return build_columns([])
+    batches = list(UGEColumnReader(file_ob))
+    if not batches:
+        return build_columns([])
+    columns = {}
+    for name, kind in UGE_FIELDS:
+        columns[name] = numpy.concatenate([batch[name] for batch in batches])
+    return columns
+
+
+def read_structured(file_ob, rows=None):
+    """
+    Parses a Univa Grid Engine accounting file into a NumPy structured array.
+
+    :param file_ob: Open accounting file.
+    :param rows: Number of rows to read, or None to read the rest of the file.
+    :return: Structured array, one record per row.
+    :rtype: numpy.ndarray
+    """
+    return to_structured(read_columns(file_ob, rows))
@@ -0,0 +1,264 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Batched export of accounting entries to CSV, JSON Lines, Arrow and Parquet files.
+
+Values are read from each batch of entries with a single operator.attrgetter call per entry, no per entry dict is
+built.  The Arrow and Parquet writers need the pyarrow package, and also accept the column batches returned by
+:py:class:`gridengine_accounting.columnar.UGEColumnReader` in place of entries.
+"""
+import csv
+import itertools
+import operator
+from json.encoder import encode_basestring_ascii
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from gridengine_accounting import SGE_FIELDS, UGE_FIELDS, UGEAccountEntry
+
+
+def entry_fields(entry):
+    """
+    Returns the fields of an entry in file order.
+
+    :param entry: UGEAccountEntry or AccountEntry.
+    :return: List of (name, attribute, kind) tuples, where attribute is where the value is stored on the entry.
+    :rtype: list
+    """
+    if isinstance(entry, UGEAccountEntry):
+        return [(name, name, kind) for name, kind in UGE_FIELDS]
+    return [(name, "_" + name, kind) for name, kind in SGE_FIELDS]
+
+
+def entry_batches(entries, batch_size):
+    """
+    Groups entries into batches of value tuples.
+
+    :param entries: Iterable of entries, all of the same type.
+    :param batch_size: Number of entries per batch.
+    :return: Generator of (fields, rows) where fields is as returned by :py:func:`entry_fields` and rows is a list
+        of tuples of values.
+    """
+    entries = iter(entries)
+    batch = list(itertools.islice(entries, batch_size))
+    if not batch:
+        return
+    fields = entry_fields(batch[0])
+    getter = operator.attrgetter(*[attribute for name, attribute, kind in fields])
+    while batch:
+        yield fields, [getter(entry) for entry in batch]
+        batch = list(itertools.islice(entries, batch_size))
+
+
+def write_csv(entries, fp, batch_size=10000, header=True):
+    """
+    Writes entries to a CSV file, one row per entry, with a header row of field names.  None is written as an
+    empty value.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.export import write_csv
+        >>> with open("accounting.csv", "wb") as fp:
+        ...     write_csv(UGEAccountFile(open("ug82_accounting")), fp)
+        21
+
+    :param entries: Iterable of entries.
+    :param fp: File object to write to.
+    :param batch_size: Number of rows per write.
+    :param header: Write a header row.
+    :return: Number of entries written.
+    :rtype: int
+    """
+    writer = csv.writer(fp)
+    count = 0
+    for fields, rows in entry_batches(entries, batch_size):
+        if header:
+            writer.writerow([name for name, attribute, kind in fields])
+            header = False
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def _encode_optional(encode):
+    def encode_optional(value):
+        if value is None:
+            return "null"
+        return encode(value)
+    return encode_optional
+
+# Function returning the JSON text of a value, for each field kind.
+JSON_ENCODERS = {
+    "str": encode_basestring_ascii,
+    "none": _encode_optional(encode_basestring_ascii),
+    "int": str,
+    "optional_int": _encode_optional(str),
+    "float": repr,
+    "ms": repr,
+}
+
+
+class JSONLinesEncoder(object):
+    """
+    Encodes entries of one type as JSON objects, one per line.  The object text is filled into a template built
+    once from the field names, with each value encoded by a function chosen from its field kind.
+
+    :param fields: Fields of the entries, as returned by :py:func:`entry_fields`.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+        pairs = ["%s:%%s" % encode_basestring_ascii(name) for name, attribute, kind in fields]
+        self._template = "{" + ",".join(pairs) + "}"
+        self._encoders = [JSON_ENCODERS[kind] for name, attribute, kind in fields]
+
+    def encode(self, values):
+        """Returns the JSON text of one tuple of field values."""
+        return self._template % tuple([encode(value) for encode, value in zip(self._encoders, values)])
+
+
+def dump_jsonl(entries, fp, batch_size=1000):
+    """
+    Writes entries to a file as JSON Lines, one object per entry with a key for each field in file order.  The
+    computed *_milliseconds attributes of UGE entries are not written.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.export import dump_jsonl
+        >>> with open("accounting.jsonl", "wb") as fp:
+        ...     dump_jsonl(UGEAccountFile(open("ug82_accounting")), fp)
+        21
+
+    :param entries: Iterable of entries, all of the same type.
+    :param fp: File object to write to.
+    :param batch_size: Number of lines per write.
+    :return: Number of entries written.
+    :rtype: int
+    """
+    encoder = None
+    count = 0
+    for fields, rows in entry_batches(entries, batch_size):
+        if encoder is None:
+            encoder = JSONLinesEncoder(fields)
+        encode = encoder.encode
+        fp.write("\n".join([encode(row) for row in rows]) + "\n")
+        count += len(rows)
+    return count
+
+
+def _arrow_type(kind):
+    if kind in ("str", "none"):
+        return pyarrow.string()
+    if kind in ("int", "optional_int"):
+        return pyarrow.int64()
+    return pyarrow.float64()
+
+
+def record_batches(source, batch_size=100000):
+    """
+    Converts entries, or column batches, to Arrow record batches.
+
+    :param source: Iterable of entries, or of dicts of column arrays from UGEColumnReader.
+    :param batch_size: Number of entries per record batch, column batches are converted as they are.
+    :return: Generator of pyarrow.RecordBatch.
+    """
+    if pyarrow is None:
+        raise ImportError("Arrow export requires pyarrow")
+    source = iter(source)
+    try:
+        first = next(source)
+    except StopIteration:
+        return
+    source = itertools.chain([first], source)
+
+    if isinstance(first, dict):
+        for columns in source:
+            arrays = []
+            for name, kind in UGE_FIELDS:
+                column = columns[name]
+                if kind == "str":
+                    column = column.tolist()
+                arrays.append(pyarrow.array(column, type=_arrow_type(kind)))
+            yield pyarrow.RecordBatch.from_arrays(arrays, [name for name, kind in UGE_FIELDS])
+        return
+
+    for fields, rows in entry_batches(source, batch_size):
+        arrays = []
+        for (name, attribute, kind), column in zip(fields, zip(*rows)):
+            arrays.append(pyarrow.array(list(column), type=_arrow_type(kind)))
+        yield pyarrow.RecordBatch.from_arrays(arrays, [name for name, attribute, kind in fields])
+
+
+def write_parquet(source, path, batch_size=100000, compression="snappy"):
+    """
+    Writes entries, or column batches, to a Parquet file, one row group per batch.
+
+    Example::
+
+        >>> from gridengine_accounting.columnar import UGEColumnReader
+        >>> from gridengine_accounting.export import write_parquet
+        >>> write_parquet(UGEColumnReader(open("ug82_accounting")), "accounting.parquet")
+        21
+
+    :param source: Iterable of entries, or of dicts of column arrays from UGEColumnReader.
+    :param path: Path of the Parquet file.
+    :param batch_size: Number of entries per row group.
+    :param compression: Parquet compression codec.
+    :return: Number of rows written.
+    :rtype: int
+    """
+    writer = None
+    count = 0
+    try:
+        for batch in record_batches(source, batch_size):
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(path, batch.schema, compression=compression)
+            writer.write_table(pyarrow.Table.from_batches([batch]))
+            count += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def write_arrow(source, path, batch_size=100000):
+    """
+    Writes entries, or column batches, to an Arrow IPC file.  Arguments are as for :py:func:`write_parquet`.
+
+    :return: Number of rows written.
+    :rtype: int
+    """
+    writer = None
+    sink = None
+    count = 0
+    try:
+        for batch in record_batches(source, batch_size):
+            if writer is None:
+                sink = pyarrow.OSFile(path, "wb")
+                writer = pyarrow.RecordBatchFileWriter(sink, batch.schema)
+            writer.write_batch(batch)
+            count += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+            sink.close()
+    return count
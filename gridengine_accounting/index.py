@@ -0,0 +1,217 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Sidecar index mapping job numbers and end times to byte offsets in an accounting file.
+
+The index file starts with a header holding the number of bytes of the accounting file that were indexed, always
+whole rows, and its modification time, followed by two tables of the same (job_number, task_number, end_time,
+offset) records.  The first table is sorted by job and task number, the second by end time, so both kinds of lookup
+are a binary search over the memory mapped file.  When rows are appended to the accounting file only the new rows
+are read, and their records are inserted into the existing tables.
+"""
+import mmap
+import os
+import struct
+
+MAGIC = b"GEACIDX1"
+_HEADER = struct.Struct("<8sqdq")
+_RECORD = struct.Struct("<qqdq")
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def _ends_row(path, offset):
+    """Returns whether offset in the file at path is the start of a row, a check that rows were only appended."""
+    if offset == 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
+
+
+def _job_order(record):
+    return record
+
+
+def _end_time_order(record):
+    return record[2], record[3]
+
+
+class AccountIndex(object):
+    """
+    Index of the rows of an accounting file by job_number, task_number and end_time.  Most code should use the
+    lookup() and range() methods of AccountFile and UGEAccountFile, which open the index themselves::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> for ac in UGEAccountFile(open("ug82_accounting")).lookup(9):
+        ...     print ac.end_time
+        1416359445.08
+
+    """
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self._file_ob = open(index_path, "rb")
+        self._map = mmap.mmap(self._file_ob.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.source_size, self.source_mtime, self.count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an accounting index: %s" % index_path)
+
+    @staticmethod
+    def index_path_for(path):
+        return path + ".idx"
+
+    @staticmethod
+    def _scan(path, keys, offset):
+        """Returns the records of the whole rows of the file at path from offset on, and the offset after them."""
+        records = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partly written row, indexed once it is complete.
+                key = keys(line)
+                if key is not None:
+                    records.append(key + (offset,))
+                offset += len(line)
+        return records, offset
+
+    @classmethod
+    def _write(cls, index_path, size, mtime, count, tables):
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, size, mtime, count))
+            for table in tables:
+                f.writelines(table)
+        os.rename(tmp_path, index_path)
+        return cls(index_path)
+
+    @classmethod
+    def build(cls, path, keys, index_path=None):
+        """
+        Scans the accounting file at path and writes its index.
+
+        :param path: Path to the accounting file.
+        :param keys: Callable that is given a row and returns (job_number, task_number, end_time), or None for rows
+            that are not indexed.
+        :param index_path: Where to write the index, defaults to path with an .idx suffix.
+        :return: The new index.
+        :rtype: AccountIndex
+        """
+        index_path = index_path or cls.index_path_for(path)
+        mtime = _stamp(path)[1]
+        records, size = cls._scan(path, keys, 0)
+        by_job = [_RECORD.pack(*record) for record in sorted(records)]
+        by_end_time = [_RECORD.pack(*record) for record in sorted(records, key=_end_time_order)]
+        return cls._write(index_path, size, mtime, len(records), [by_job, by_end_time])
+
+    def extend(self, path, keys):
+        """
+        Indexes the rows appended to the accounting file at path since this index was written, and returns the new
+        index.  This index is closed.
+
+        :rtype: AccountIndex
+        """
+        mtime = _stamp(path)[1]
+        records, size = self._scan(path, keys, self.source_size)
+        tables = [self._merged(0, sorted(records), _job_order),
+                  self._merged(1, sorted(records, key=_end_time_order), _end_time_order)]
+        self.close()
+        return self._write(self.index_path, size, mtime, self.count + len(records), tables)
+
+    def _merged(self, table, records, order):
+        """Returns the pieces of table with records, sorted by order, inserted in order."""
+        start = _HEADER.size + table * self.count * _RECORD.size
+        pieces = []
+        done = 0
+        for record in records:
+            key = order(record)
+            i = self._bisect(table, lambda other: order(other) <= key)
+            pieces.append(self._map[start + done * _RECORD.size:start + i * _RECORD.size])
+            pieces.append(_RECORD.pack(*record))
+            done = i
+        pieces.append(self._map[start + done * _RECORD.size:start + self.count * _RECORD.size])
+        return pieces
+
+    @classmethod
+    def open(cls, path, keys, index_path=None):
+        """
+        Opens the index of the accounting file at path, building it if it is missing.  If the accounting file has
+        grown since the index was written the new rows are added to it, if it has shrunk the index is built again.
+        Arguments are as for :py:meth:`build`.
+
+        :rtype: AccountIndex
+        """
+        index_path = index_path or cls.index_path_for(path)
+        if os.path.exists(index_path):
+            index = cls(index_path)
+            size, mtime = _stamp(path)
+            if (index.source_size, index.source_mtime) == (size, mtime):
+                return index
+            if size >= index.source_size and _ends_row(path, index.source_size):
+                return index.extend(path, keys)
+            index.close()
+        return cls.build(path, keys, index_path)
+
+    def close(self):
+        self._map.close()
+        self._file_ob.close()
+
+    def _record(self, table, i):
+        return _RECORD.unpack_from(self._map, _HEADER.size + (table * self.count + i) * _RECORD.size)
+
+    def _bisect(self, table, before):
+        """Returns the position of the first record in table for which before(record) is False."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if before(self._record(table, mid)):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, job_number, task_number=None):
+        """
+        Returns the byte offsets of the rows of a job, or of one task of a job, in file order.
+
+        :rtype: list
+        """
+        key = (job_number,) if task_number is None else (job_number, task_number)
+        offsets = []
+        for i in range(self._bisect(0, lambda record: record[:len(key)] < key), self.count):
+            record = self._record(0, i)
+            if record[:len(key)] != key:
+                break
+            offsets.append(record[3])
+        return sorted(offsets)
+
+    def range(self, start, end):
+        """
+        Returns the byte offsets of the rows with an end_time between start and end inclusive, in end_time order.
+
+        :rtype: list
+        """
+        offsets = []
+        for i in range(self._bisect(1, lambda record: record[2] < start), self.count):
+            record = self._record(1, i)
+            if record[2] > end:
+                break
+            offsets.append(record[3])
+        return offsets
@@ -0,0 +1,188 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Streaming merge of the rows of each job, array tasks and retried attempts, into one summary per job.
+"""
+import heapq
+
+DAY = 86400
+
+
+class JobSummary(object):
+    """
+    Totals of every row of one job.  Rows of attempts that failed before the job started have times of 0, these are
+    left out of submission_time and start_time.
+
+    :ivar job_number: Job number.
+    :ivar owner: Owner of the first row.
+    :ivar job_name: Job name of the first row.
+    :ivar rows: Number of rows merged.
+    :ivar failed_rows: Number of rows with failed != 0, retried attempts included.
+    :ivar tasks: Number of distinct task numbers.
+    :ivar slot_seconds: Sum of ru_wallclock multiplied by slots.
+    :ivar cpu: Sum of cpu.
+    :ivar maxvmem: Largest maxvmem of any row.
+    :ivar maxrss: Largest maxrss of any row in bytes, or None for entries without the field, such as AccountEntry.
+    :ivar submission_time: Earliest submission time, 0 if no row has one.
+    :ivar start_time: Earliest start time, 0 if no row started.
+    :ivar end_time: Latest end time.
+    """
+    __slots__ = ["job_number", "owner", "job_name", "rows", "failed_rows", "slot_seconds", "cpu", "maxvmem",
+                 "maxrss", "submission_time", "start_time", "end_time", "_tasks", "_seen"]
+
+    def __init__(self, entry):
+        self.job_number = entry.job_number
+        self.owner = entry.owner
+        self.job_name = entry.job_name
+        self.rows = 0
+        self.failed_rows = 0
+        self.slot_seconds = 0
+        self.cpu = 0
+        self.maxvmem = entry.maxvmem
+        self.maxrss = getattr(entry, "maxrss", None)
+        self.submission_time = 0
+        self.start_time = 0
+        self.end_time = entry.end_time
+        self._tasks = set()
+        self._seen = 0
+
+    @property
+    def tasks(self):
+        return len(self._tasks)
+
+    @property
+    def retries(self):
+        """Number of rows beyond one per task."""
+        return self.rows - len(self._tasks)
+
+    def add(self, entry):
+        """Adds one row of this job."""
+        self.rows += 1
+        if int(entry.failed):  # AccountEntry.failed is a string.
+            self.failed_rows += 1
+        self._tasks.add(entry.task_number)
+        self.slot_seconds += entry.ru_wallclock * entry.slots
+        self.cpu += entry.cpu
+        if entry.maxvmem > self.maxvmem:
+            self.maxvmem = entry.maxvmem
+        if self.maxrss is not None and entry.maxrss > self.maxrss:
+            self.maxrss = entry.maxrss
+        submission_time = entry.submission_time
+        if submission_time and (not self.submission_time or submission_time < self.submission_time):
+            self.submission_time = submission_time
+        start_time = entry.start_time
+        if start_time and (not self.start_time or start_time < self.start_time):
+            self.start_time = start_time
+        if entry.end_time > self.end_time:
+            self.end_time = entry.end_time
+
+    def to_dict(self):
+        d = dict((name, getattr(self, name)) for name in self.__slots__ if not name.startswith("_"))
+        d["tasks"] = self.tasks
+        d["retries"] = self.retries
+        return d
+
+
+class JobMerger(object):
+    """
+    Collapses a stream of accounting entries into one :py:class:`JobSummary` per job number.
+
+    Accounting files are written as jobs finish, so the rows of a job are close together.  The watermark is the
+    latest end time seen so far, and a job is flushed once the watermark has moved more than horizon seconds past
+    where it was when the last row of the job arrived, so only jobs still finishing are held in memory.  If more
+    than max_jobs are open the ones seen longest ago are flushed early, with a tenth more to spare.  A row arriving
+    for a job that was already flushed starts a new summary, so horizon should be longer than the time between the
+    first and last task of the longest array job.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.jobs import JobMerger
+        >>> for job in JobMerger().merge(UGEAccountFile(open("ug82_accounting"), lazy=True)):
+        ...     print job.job_number, job.tasks, job.slot_seconds
+        [...]
+
+    :param horizon: Seconds of end time after which a job is considered complete.
+    :param max_jobs: Largest number of jobs held open, or None for no limit.
+    :param check_every: Number of rows between checks for complete jobs.
+    """
+    def __init__(self, horizon=DAY, max_jobs=1000000, check_every=10000):
+        self.horizon = horizon
+        self.max_jobs = max_jobs
+        self.check_every = check_every
+        self.jobs = {}
+        self.watermark = 0
+        self._count = 0
+
+    def add(self, entry):
+        """
+        Adds one entry.
+
+        :return: List of summaries of jobs that are now complete, usually empty.
+        """
+        try:
+            job = self.jobs[entry.job_number]
+        except KeyError:
+            job = self.jobs[entry.job_number] = JobSummary(entry)
+        job.add(entry)
+        if entry.end_time > self.watermark:
+            self.watermark = entry.end_time
+        job._seen = self.watermark
+        self._count += 1
+        if self._count >= self.check_every or (self.max_jobs is not None and len(self.jobs) > self.max_jobs):
+            self._count = 0
+            return self._flush_complete()
+        return []
+
+    def _flush_complete(self):
+        cutoff = self.watermark - self.horizon
+        jobs = self.jobs
+        done = [job for job in jobs.values() if job._seen < cutoff]
+        if self.max_jobs is not None and len(jobs) - len(done) > self.max_jobs:
+            # Flush a tenth more than needed so the next rows do not each trigger a scan of every open job.
+            open_jobs = [job for job in jobs.values() if job._seen >= cutoff]
+            extra = len(open_jobs) - self.max_jobs + self.max_jobs // 10
+            done.extend(heapq.nsmallest(extra, open_jobs, key=lambda job: job._seen))
+        for job in done:
+            del jobs[job.job_number]
+        done.sort(key=lambda job: job.end_time)
+        return done
+
+    def flush(self):
+        """
+        Returns the summaries of every open job and empties the merger, call this after the last entry.
+
+        :rtype: list
+        """
+        done = sorted(self.jobs.values(), key=lambda job: job.end_time)
+        self.jobs = {}
+        return done
+
+    def merge(self, entries):
+        """
+        Adds every entry from an iterable and generates job summaries as jobs complete, then the rest at the end.
+        Summaries are in order of latest end time within each flush.
+
+        :param entries: Iterable of UGEAccountEntry or AccountEntry objects.
+        :return: Generator of JobSummary.
+        """
+        add = self.add
+        for entry in entries:
+            for job in add(entry):
+                yield job
+        for job in self.flush():
+            yield job
@@ -0,0 +1,182 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Reading a set of accounting files, such as the current file and its rotated archives, with a pool of worker
+processes.
+"""
+import functools
+import glob
+import heapq
+import itertools
+import multiprocessing
+import operator
+import os
+import pickle
+import shutil
+import tempfile
+
+from gridengine_accounting import UGEAccountFile, open_accounting, _string_types
+from gridengine_accounting.aggregate import Aggregator
+
+# Suffixes of the files written next to an accounting file by the index, checkpoints and the SQLite store, and of
+# their temporary files, which a glob such as accounting* also matches.
+SIDECAR_SUFFIXES = (".idx", ".checkpoint", ".db", ".tmp")
+
+# Entries per pickled batch in a sorted run.
+_BATCH_SIZE = 1000
+
+
+def _map_file(args):
+    func, reader_class, path, kwargs = args
+    f = open_accounting(path)
+    try:
+        return func(reader_class(f, **kwargs))
+    finally:
+        f.close()
+
+
+def _sort_file(args):
+    """
+    Reads a file and writes its entries to temporary files in runs of run_size entries, each sorted by order_by.
+
+    :return: List of the paths of the runs, in file order.
+    """
+    reader_class, path, kwargs, order_by, run_size, run_prefix = args
+    key = operator.attrgetter(order_by)
+    runs = []
+    f = open_accounting(path)
+    try:
+        entries = reader_class(f, **kwargs)
+        while True:
+            run = list(itertools.islice(entries, run_size))
+            if not run:
+                return runs
+            run.sort(key=key)
+            run_path = "%s.%d" % (run_prefix, len(runs))
+            with open(run_path, "wb") as out:
+                for i in range(0, len(run), _BATCH_SIZE):
+                    pickle.dump(run[i:i + _BATCH_SIZE], out, pickle.HIGHEST_PROTOCOL)
+            runs.append(run_path)
+    finally:
+        f.close()
+
+
+def _read_run(path):
+    """Generates the entries of a run written by _sort_file."""
+    with open(path, "rb") as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            for entry in batch:
+                yield entry
+
+
+def _aggregate(kwargs, entries):
+    aggregator = Aggregator(**kwargs)
+    aggregator.update(entries)
+    return aggregator
+
+
+def _keyed(order_by, n, entries):
+    for i, entry in enumerate(entries):
+        yield getattr(entry, order_by), n, i, entry
+
+
+class MultiAccountFile(object):
+    """
+    A set of accounting files of the same format, each parsed by a worker in a process pool so that the files are
+    read and decompressed concurrently.  Compressed files are opened with :py:func:`open_accounting`.
+
+    Iterating returns the entries of every file in a single stream strictly ordered by order_by, entries with equal
+    values keep their order in paths and in their file.  The files are sorted by the worker processes in runs of
+    run_size entries, which are written to temporary files in the system temporary directory and then merged, so no
+    entries are returned until every file has been read.  For reports that do not need the entries in order use
+    :py:meth:`aggregate` or :py:meth:`map`, which only return one result per file.
+
+    When paths is a glob pattern, directories and files ending in one of SIDECAR_SUFFIXES are left out.
+
+    Example::
+
+        >>> from gridengine_accounting.multi import MultiAccountFile
+        >>> files = MultiAccountFile("/opt/sge/default/common/accounting*", processes=8)
+        >>> for row in files.aggregate(group_by=["project"]).rows():
+        ...     print row["project"], row["slot_seconds"]
+        [...]
+
+    :param paths: Glob pattern, or list of paths.
+    :param reader_class: Class that reads each file, UGEAccountFile, AccountFile or a subclass of either.
+    :param processes: Number of worker processes, defaults to the number of CPUs.
+    :param order_by: Attribute that orders the merged entries.
+    :param run_size: Number of entries a worker sorts in memory at a time when iterating.
+    :param kwargs: Extra arguments passed to reader_class, such as where.
+    """
+    def __init__(self, paths, reader_class=UGEAccountFile, processes=None, order_by="end_time", run_size=100000,
+                 **kwargs):
+        if isinstance(paths, _string_types):
+            paths = sorted(path for path in glob.glob(paths)
+                           if os.path.isfile(path) and not path.endswith(SIDECAR_SUFFIXES))
+        self.paths = list(paths)
+        self.reader_class = reader_class
+        self.processes = processes
+        self.order_by = order_by
+        self.run_size = run_size
+        self.kwargs = kwargs
+
+    def map(self, func):
+        """
+        Calls func with a reader over each file, in a worker process.
+
+        :param func: Function taking an iterable of entries, it and its result must be picklable.
+        :return: Generator of (path, result) tuples in the order of paths, each returned as soon as it and the
+            ones before it are done.
+        """
+        jobs = [(func, self.reader_class, path, self.kwargs) for path in self.paths]
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for n, result in enumerate(pool.imap(_map_file, jobs)):
+                yield self.paths[n], result
+        finally:
+            pool.terminate()
+
+    def aggregate(self, **kwargs):
+        """
+        Sums each file in its own :py:class:`gridengine_accounting.aggregate.Aggregator` and merges the results.
+
+        :param kwargs: Arguments to the Aggregator, metric functions must be module level functions.
+        :rtype: Aggregator
+        """
+        total = Aggregator(**kwargs)
+        for path, aggregator in self.map(functools.partial(_aggregate, kwargs)):
+            total.merge(aggregator)
+        return total
+
+    def __iter__(self):
+        tmp = tempfile.mkdtemp()
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            jobs = [(self.reader_class, path, self.kwargs, self.order_by, self.run_size, os.path.join(tmp, str(n)))
+                    for n, path in enumerate(self.paths)]
+            runs = [run for file_runs in pool.imap(_sort_file, jobs) for run in file_runs]
+            pool.close()
+            streams = [_keyed(self.order_by, n, _read_run(run)) for n, run in enumerate(runs)]
+            for key, n, i, entry in heapq.merge(*streams):
+                yield entry
+        finally:
+            pool.terminate()
+            shutil.rmtree(tmp)
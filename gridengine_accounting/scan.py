@@ -0,0 +1,161 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Count and filter queries over memory mapped accounting files.
+
+Rows are matched by a regular expression running over the mapped file itself, and only the columns a query uses are
+copied out of the mapping, the rest of each row is never turned into strings.  The page cache does the I/O.
+"""
+import mmap
+import re
+
+from gridengine_accounting import (SGE_DIALECTS, UGE_FIELDS, _SGE_INDEXES, _UGE_INDEX, _compile_where,
+                                   _from_milliseconds, _text)
+
+# Converters that accept the bytes sliced from the mapping as they are, values of any other field are decoded first.
+_BYTES_CONVERTERS = frozenset([int, float, _from_milliseconds])
+
+
+def _mapped_index(index):
+    """Copies a field index so that its converters take the raw bytes of a mapped column."""
+    if bytes is str:
+        return index
+    mapped = {}
+    for name, (i, convert) in index.items():
+        if i is not None and convert not in _BYTES_CONVERTERS:
+            convert = (lambda convert: lambda value: convert(_text(value)))(convert)
+        mapped[name] = (i, convert)
+    return mapped
+
+
+def _row_pattern(fields, wanted, acct):
+    """
+    Compiles a regular expression matching a row of exactly the given number of fields, capturing the wanted
+    columns.  The expression runs over the mapping itself, so rows are never copied out of it.
+    """
+    parts = []
+    for column in range(fields):
+        if acct and column == 1:
+            parts.append(b"acct")
+        elif column in wanted:
+            parts.append(b"([^:\\n]*)")
+        else:
+            parts.append(b"[^:\\n]*")
+    return re.compile(b"^(?!#)" + b":".join(parts) + b"$", re.MULTILINE)
+
+
+class MappedAccountFile(object):
+    """
+    Memory mapped accounting file of a single dialect.  Rows with the wrong number of fields for the dialect, such
+    as other record types in a reporting file or a partly written last row, are skipped.
+
+    Example::
+
+        >>> from gridengine_accounting.scan import MappedAccountFile
+        >>> with MappedAccountFile("ug82_accounting") as f:
+        ...     print f.count(where={"owner": "irvined", "failed": 0})
+        ...     for job_number, end_time in f.scan(["job_number", "end_time"], where={"exit_status": 137}):
+        ...         print job_number, end_time
+        16
+        2 1416359122.83
+
+    :param path: Path to the accounting file, it must not be compressed.
+    :param dialect: None for a Univa Grid Engine file, or the name of an SGE dialect in SGE_DIALECTS.
+    """
+    def __init__(self, path, dialect=None):
+        self._index = _mapped_index(_UGE_INDEX if dialect is None else _SGE_INDEXES[dialect])
+        self._separators = (len(UGE_FIELDS) if dialect is None else len(SGE_DIALECTS[dialect])) - 1
+        self._acct = dialect == "acct"
+        self._file_ob = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file_ob.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files can not be mapped.
+            self._map = b""
+
+    def close(self):
+        if not isinstance(self._map, bytes):
+            self._map.close()
+        self._file_ob.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _columns(self, names):
+        columns = []
+        for name in names:
+            try:
+                i, convert = self._index[name]
+            except KeyError:
+                raise ValueError("Unknown field: %s" % name)
+            if i is None:
+                raise ValueError("Field %s is not present in this dialect" % name)
+            columns.append(i)
+        return columns
+
+    def _rows(self, columns):
+        """
+        Generates a dict of column index to raw value for every row of the dialect, holding only the given columns.
+        """
+        wanted = sorted(set(columns))
+        pattern = _row_pattern(self._separators + 1, wanted, self._acct)
+        for match in pattern.finditer(self._map):
+            yield dict(zip(wanted, match.groups()))
+
+    def _predicate(self, where):
+        if where is None:
+            return None, []
+        if callable(where):
+            raise ValueError("where must be a dict of criteria")
+        predicate = _compile_where(where, self._index)
+        columns = []
+        for key in where:
+            name = key[:-len("_between")] if key.endswith("_between") else key
+            i = self._index[name][0]
+            if i is not None:  # Absent columns are tested against their default when compiled.
+                columns.append(i)
+        return predicate, columns
+
+    def scan(self, fields, where=None):
+        """
+        Returns the values of some fields for every row that matches where.
+
+        :param fields: Names of the fields to return.
+        :param where: Dict of criteria as for AccountFile, callables over the whole row are not supported.
+        :return: Generator of tuples of converted values, in the order of fields.
+        """
+        predicate, where_columns = self._predicate(where)
+        columns = self._columns(fields)
+        converters = [self._index[name][1] for name in fields]
+        for raw in self._rows(columns + where_columns):
+            if predicate is None or predicate(raw):
+                yield tuple([convert(raw[i]) for i, convert in zip(columns, converters)])
+
+    def count(self, where=None):
+        """
+        Returns the number of rows that match where.
+
+        :param where: Dict of criteria as for AccountFile, or None to count every row.
+        :rtype: int
+        """
+        predicate, where_columns = self._predicate(where)
+        if predicate is None:
+            return sum(1 for raw in self._rows([]))
+        return sum(1 for raw in self._rows(where_columns) if predicate(raw))
+
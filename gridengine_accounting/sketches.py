@@ -0,0 +1,275 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Approximate percentiles and fixed bin histograms of job metrics in bounded memory.
+
+Every sketch can be merged with another of the same configuration, so sketches built on parallel chunks of a file,
+or on the files of several days, add up to the sketch of all of them.
+"""
+import bisect
+import math
+import operator
+
+
+class QuantileSketch(object):
+    """
+    Streaming quantile sketch with a relative error guarantee.  Values are counted in buckets whose bounds grow
+    geometrically, so any quantile is returned within relative_accuracy of a value of that rank, whatever the
+    spread of the data.  A sketch of a billion run times spanning seconds to months needs a few thousand buckets.
+
+    When there are more than max_buckets buckets the lowest ones are folded together, which only makes the
+    smallest quantiles less accurate.
+
+    :param relative_accuracy: Relative error of the returned quantiles.
+    :param max_buckets: Largest number of buckets for positive values, and the same again for negative values.
+    """
+    # Values closer to zero than this are counted as zero.
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.zero_count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0
+        # Bucket index to count, for positive values and for the magnitude of negative values.
+        self.positive = {}
+        self.negative = {}
+
+    def add(self, value, count=1):
+        """Adds a value, count times."""
+        self.count += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value > self.MIN_VALUE:
+            store = self.positive
+        elif value < -self.MIN_VALUE:
+            store = self.negative
+            value = -value
+        else:
+            self.zero_count += count
+            return
+        i = int(math.ceil(math.log(value) / self._log_gamma))
+        try:
+            store[i] += count
+        except KeyError:
+            store[i] = count
+            if len(store) > self.max_buckets:
+                self._collapse(store)
+
+    def _collapse(self, store):
+        indexes = sorted(store)
+        excess = len(indexes) - self.max_buckets
+        folded = sum(store.pop(i) for i in indexes[:excess])
+        store[indexes[excess]] += folded
+
+    def merge(self, other):
+        """Adds the values counted by another sketch with the same relative accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with different relative accuracy can not be merged")
+        if not other.count:
+            return
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self.sum += other.sum
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for i, count in other_store.items():
+                store[i] = store.get(i, 0) + count
+            if len(store) > self.max_buckets:
+                self._collapse(store)
+
+    def _value(self, i):
+        return 2 * self.gamma ** i / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Returns the approximate value at quantile q.
+
+        :param q: Quantile between 0 and 1, 0.5 for the median.
+        :return: The value, or None if the sketch is empty.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for i in sorted(self.negative, reverse=True):
+            seen += self.negative[i]
+            if seen > rank:
+                return max(-self._value(i), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0
+        for i in sorted(self.positive):
+            seen += self.positive[i]
+            if seen > rank:
+                return min(self._value(i), self.max)
+        return self.max
+
+    def quantiles(self, qs):
+        """Returns a list of the approximate values at each quantile in qs."""
+        return [self.quantile(q) for q in qs]
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.sum / float(self.count)
+
+
+class Histogram(object):
+    """
+    Counts values into fixed bins.
+
+    :param edges: Sorted bin edges, bin i counts values from edges[i] up to but excluding edges[i + 1].  Values
+        below the first edge are counted in underflow and values from the last edge on in overflow.
+    """
+    def __init__(self, edges):
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) - 1)
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, value, count=1):
+        """Adds a value, count times."""
+        i = bisect.bisect_right(self.edges, value)
+        if i == 0:
+            self.underflow += count
+        elif i == len(self.edges):
+            self.overflow += count
+        else:
+            self.counts[i - 1] += count
+
+    def merge(self, other):
+        """Adds the counts of another histogram with the same edges."""
+        if other.edges != self.edges:
+            raise ValueError("Histograms with different edges can not be merged")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+
+    def bins(self):
+        """Returns a list of (low, high, count) tuples, one per bin."""
+        return list(zip(self.edges, self.edges[1:], self.counts))
+
+
+def wait_time(entry):
+    """Seconds between submission and start, None for jobs that never started."""
+    if not entry.start_time:
+        return None
+    return entry.start_time - entry.submission_time
+
+
+def cpu_efficiency(entry):
+    """CPU time divided by wallclock time multiplied by slots, None for jobs that used no wallclock time."""
+    slot_seconds = entry.ru_wallclock * entry.slots
+    if not slot_seconds:
+        return None
+    return entry.cpu / slot_seconds
+
+DEFAULT_METRICS = {
+    "wait_time": wait_time,
+    "ru_wallclock": "ru_wallclock",
+    "maxvmem": "maxvmem",
+    "cpu_efficiency": cpu_efficiency,
+}
+
+
+class MetricSketches(object):
+    """
+    Builds a sketch of each metric for each group of accounting entries in a single pass.
+
+    Metrics are given as a dict of name to either an attribute name or a function of an entry that returns None
+    for entries the metric does not apply to.  A Histogram needs edges in the unit of its metric, so histograms are
+    given per metric, for example::
+
+        factory={"wait_time": functools.partial(Histogram, edges=[0, 60, 3600, 86400]),
+                 "maxvmem": functools.partial(Histogram, edges=[0, 2 ** 30, 2 ** 33, 2 ** 36])}
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.sketches import MetricSketches
+        >>> sketches = MetricSketches(group_by=["qname"])
+        >>> sketches.update(UGEAccountFile(open("ug82_accounting"), lazy=True))
+        >>> for key, metrics in sorted(sketches.sketches.items()):
+        ...     print key, metrics["wait_time"].quantiles([0.5, 0.9, 0.99])
+        [...]
+
+    :param group_by: Attribute names to group by, empty for a single group.
+    :param metrics: Dict of metric name to attribute name or function, defaults to DEFAULT_METRICS.
+    :param factory: Callable returning a new sketch, or a dict of metric name to such a callable, with
+        QuantileSketch used for metrics left out of the dict.
+    """
+    def __init__(self, group_by=("qname",), metrics=None, factory=QuantileSketch):
+        self.group_by = list(group_by)
+        self.metrics = dict(metrics or DEFAULT_METRICS)
+        self.factory = factory
+        if isinstance(factory, dict):
+            self._factories = dict((name, factory.get(name, QuantileSketch)) for name in self.metrics)
+        else:
+            self._factories = dict((name, factory) for name in self.metrics)
+        # Group key tuple to dict of metric name to sketch.
+        self.sketches = {}
+        self._getters = []
+        for name, metric in sorted(self.metrics.items()):
+            self._getters.append((name, metric if callable(metric) else operator.attrgetter(metric)))
+        self._key_getter = operator.attrgetter(*self.group_by) if self.group_by else lambda entry: ()
+        self._single_field = len(self.group_by) == 1
+
+    def _group(self, key):
+        try:
+            return self.sketches[key]
+        except KeyError:
+            group = self.sketches[key] = dict((name, self._factories[name]()) for name in self.metrics)
+            return group
+
+    def add(self, entry):
+        """Adds one entry."""
+        key = self._key_getter(entry)
+        if self._single_field:
+            key = (key,)
+        group = self._group(key)
+        for name, getter in self._getters:
+            value = getter(entry)
+            if value is not None:
+                group[name].add(value)
+
+    def update(self, entries):
+        """Adds every entry from an iterable, such as an AccountFile or UGEAccountFile."""
+        add = self.add
+        for entry in entries:
+            add(entry)
+
+    def merge(self, other):
+        """Adds the sketches of another MetricSketches with the same configuration."""
+        for key, metrics in other.sketches.items():
+            group = self._group(key)
+            for name, sketch in metrics.items():
+                group[name].merge(sketch)
@@ -0,0 +1,180 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Local SQLite copy of accounting files, kept up to date by loading only the rows appended since the last sync.
+"""
+import io
+import itertools
+import operator
+import os
+import sqlite3
+
+from gridengine_accounting import SGE_FIELDS, UGE_FIELDS, UGEAccountFile
+
+SQL_TYPES = {
+    "str": "TEXT",
+    "none": "TEXT",
+    "int": "INTEGER",
+    "optional_int": "INTEGER",
+    "float": "REAL",
+    "ms": "REAL",
+}
+
+# Columns that are indexed for the usual per job, per user, per project and per period queries.
+INDEXED = ["job_number", "owner", "project", "end_time"]
+
+# Columns that identify a row, rows already in the store are not inserted again.
+UNIQUE = ["job_number", "task_number", "end_time", "hostname"]
+
+if bytes is str:
+    def _sql_text(value):
+        if isinstance(value, str):
+            return value.decode("utf-8", "replace")
+        return value
+else:
+    def _sql_text(value):
+        # Bytes that were not valid UTF-8 are read as surrogates, which SQLite can not store.
+        if isinstance(value, str) and not value.isascii():
+            return value.encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+        return value
+
+
+class AccountStore(object):
+    """
+    SQLite database holding one table, accounting, with a typed column per field of the accounting file format,
+    times in seconds.  Rows are inserted in large executemany transactions.
+
+    :py:meth:`sync` records how far into each accounting file it has loaded in the same transaction as the rows,
+    so running it again, even after a crash, only loads complete rows appended since.  A row with the same
+    job_number, task_number, end_time and hostname as one already stored is not inserted again, so loading a
+    rotated file again under its new name does not duplicate its rows.  Text that is not valid UTF-8 is stored with
+    the invalid bytes replaced.
+
+    Example::
+
+        >>> from gridengine_accounting.store import AccountStore
+        >>> store = AccountStore("accounting.db")
+        >>> store.sync("/opt/sge/default/common/accounting")
+        21
+        >>> store.query("SELECT owner, SUM(cpu) FROM accounting WHERE project = ? GROUP BY owner", ["x"])
+        [...]
+
+    :param db_path: Path to the SQLite database, it is created if needed.
+    :param reader_class: UGEAccountFile, AccountFile, or a subclass of either, sets the table columns.
+    """
+    def __init__(self, db_path, reader_class=UGEAccountFile):
+        self.reader_class = reader_class
+        if issubclass(reader_class, UGEAccountFile):
+            self.fields = [(name, name, kind) for name, kind in UGE_FIELDS]
+        else:
+            self.fields = [(name, "_" + name, kind) for name, kind in SGE_FIELDS]
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self._getter = operator.attrgetter(*[attribute for name, attribute, kind in self.fields])
+        self._text_columns = [i for i, (name, attribute, kind) in enumerate(self.fields) if kind in ("str", "none")]
+        self._insert_sql = "INSERT OR IGNORE INTO accounting VALUES (%s)" % ", ".join(["?"] * len(self.fields))
+        self._create()
+
+    def _create(self):
+        columns = ", ".join('"%s" %s' % (name, SQL_TYPES[kind]) for name, attribute, kind in self.fields)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS accounting (%s)" % columns)
+            for name in INDEXED:
+                self.db.execute('CREATE INDEX IF NOT EXISTS accounting_%s ON accounting ("%s")' % (name, name))
+            self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS accounting_row ON accounting (%s)" %
+                            ", ".join('"%s"' % name for name in UNIQUE))
+            self.db.execute("CREATE TABLE IF NOT EXISTS sync_state "
+                            "(path TEXT PRIMARY KEY, offset INTEGER NOT NULL, inode INTEGER)")
+
+    def close(self):
+        self.db.close()
+
+    def _row(self, entry):
+        values = list(self._getter(entry))
+        for i in self._text_columns:
+            values[i] = _sql_text(values[i])
+        return values
+
+    def _insert(self, entries):
+        cursor = self.db.executemany(self._insert_sql, [self._row(entry) for entry in entries])
+        return cursor.rowcount
+
+    def insert(self, entries, batch_size=50000):
+        """
+        Inserts entries, committing every batch_size entries.
+
+        :param entries: Iterable of entries of this store's reader_class, such as an open reader.
+        :param batch_size: Number of rows per transaction.
+        :return: Number of rows inserted, rows already in the store are not counted.
+        :rtype: int
+        """
+        entries = iter(entries)
+        count = 0
+        while True:
+            batch = list(itertools.islice(entries, batch_size))
+            if not batch:
+                return count
+            with self.db:
+                count += self._insert(batch)
+
+    def sync(self, path, chunk_size=64 * 1024 * 1024, **kwargs):
+        """
+        Loads the rows appended to an uncompressed accounting file since the last sync of that path.  The file is
+        read in chunks of about chunk_size bytes that end on a newline, each is parsed and inserted in one
+        transaction together with the new offset.  A partly written last row is left for the next sync.  If the
+        file has been replaced or truncated it is loaded again from the start.
+
+        :param path: Path to the accounting file.
+        :param chunk_size: Approximate number of bytes per transaction.
+        :param kwargs: Extra arguments passed to reader_class, such as errors="skip".
+        :return: Number of rows inserted, rows already in the store are not counted.
+        :rtype: int
+        """
+        key = os.path.abspath(path)
+        row = self.db.execute("SELECT offset, inode FROM sync_state WHERE path = ?", [key]).fetchone()
+        offset, inode = row if row else (0, None)
+        count = 0
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if inode not in (None, st.st_ino) or offset > st.st_size:
+                offset = 0
+            f.seek(offset)
+            tail = b""
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    return count
+                data = tail + data
+                end = data.rfind(b"\n") + 1
+                tail = data[end:]
+                if not end:
+                    continue
+                with self.db:
+                    count += self._insert(self.reader_class(io.BytesIO(data[:end]), **kwargs))
+                    offset += end
+                    self.db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)", [key, offset, st.st_ino])
+
+    def query(self, sql, params=()):
+        """
+        Runs a query against the store.
+
+        :param sql: SQL statement, the table is named accounting.
+        :param params: Values for the ? placeholders in sql.
+        :return: List of result tuples.
+        :rtype: list
+        """
+        return self.db.execute(sql, params).fetchall()
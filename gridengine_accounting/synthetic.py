@@ -0,0 +1,184 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Deterministic generator of realistic accounting files in every supported format, for benchmarks and tests.
+
+Jobs are drawn from a seeded random number generator: a few heavy users, queues and projects, array jobs, parallel
+jobs, failed attempts and a range of run times and memory sizes.  The same seed always gives the same file on the same
+Python version.
+"""
+import random
+
+from gridengine_accounting import SGE_DIALECTS, UGE_FIELDS
+
+# "uge" is a Univa Grid Engine 8.x file, the others are the SGE dialects read by AccountFile.
+DIALECTS = ["uge"] + sorted(SGE_DIALECTS)
+
+_QUEUES = ["all.q", "short.q", "long.q", "gpu.q"]
+_PROJECTS = ["NONE", "genomics", "climate", "physics", "finance"]
+_USERS = ["user%02d" % i for i in range(40)]
+_NAMES = ["run.sh", "align.sh", "sim", "train.py", "QRLOGIN", "build"]
+_HOSTS = ["node%04d" % i for i in range(2000)]
+
+UGE_HEADER = "# Version: 8.2.0\n# \n# DO NOT MODIFY THIS FILE MANUALLY!\n# \n"
+
+
+def jobs(rows, seed=0, start=1416358463):
+    """
+    Generates the values of rows accounting rows.
+
+    :param rows: Number of rows.
+    :param seed: Seed of the random number generator.
+    :param start: Submission time of the first job, in seconds.
+    :return: Generator of dicts of field name to value, times in seconds.
+    """
+    rnd = random.Random(seed)
+    now = float(start)
+    job_number = 0
+    tasks = []
+    for row in range(rows):
+        if not tasks:
+            job_number += 1
+            now += rnd.expovariate(1 / 2.0)
+            count = rnd.choice([1] * 9 + [rnd.randint(2, 200)])
+            tasks = list(range(1, count + 1)) if count > 1 else [0]
+            job = {
+                "qname": rnd.choice(_QUEUES),
+                "owner": _USERS[min(int(rnd.paretovariate(1.2)) - 1, len(_USERS) - 1)],
+                "job_name": rnd.choice(_NAMES),
+                "project": rnd.choice(_PROJECTS),
+                "slots": rnd.choice([1] * 6 + [2, 4, 8, 16]),
+                "submission_time": now,
+            }
+        task_number = tasks.pop(0)
+        failed = rnd.random() < 0.03
+        if failed and rnd.random() < 0.5:
+            tasks.insert(0, task_number)  # Retried.
+        slots = job["slots"]
+        start_time = job["submission_time"] + rnd.expovariate(1 / 120.0)
+        wallclock = 0.0 if failed else round(rnd.lognormvariate(6, 1.5), 3)
+        cpu = round(wallclock * slots * rnd.uniform(0.1, 1.0), 3)
+        maxvmem = 0 if failed else int(rnd.lognormvariate(20, 1.5))
+        values = dict(job)
+        values.update({
+            "hostname": rnd.choice(_HOSTS),
+            "group": "users",
+            "job_number": job_number,
+            "account": "sge",
+            "priority": 0,
+            "start_time": 0.0 if failed else start_time,
+            "end_time": 0.0 if failed else start_time + wallclock,
+            "failed": rnd.choice([1, 26, 100]) if failed else 0,
+            "exit_status": 0 if failed else rnd.choice([0] * 19 + [1, 137]),
+            "ru_wallclock": wallclock,
+            "ru_utime": round(cpu * 0.9, 3),
+            "ru_stime": round(cpu * 0.1, 3),
+            "ru_maxrss": maxvmem // 4096,
+            "ru_minflt": rnd.randint(0, 100000),
+            "ru_majflt": rnd.randint(0, 100),
+            "ru_inblock": rnd.randint(0, 10000),
+            "ru_oublock": rnd.randint(0, 10000),
+            "ru_nvcsw": rnd.randint(0, 10000),
+            "ru_nivcsw": rnd.randint(0, 1000),
+            "department": "defaultdepartment",
+            "granted_pe": "smp" if slots > 1 else "NONE",
+            "task_number": task_number,
+            "cpu": cpu,
+            "mem": round(cpu * maxvmem / 1e9, 6),
+            "io": round(rnd.uniform(0, 1), 6),
+            "category": "-U %s -l h_rt=%d" % (job["owner"], rnd.choice([3600, 86400])),
+            "iow": 0.0,
+            "pe_taskid": "NONE",
+            "maxvmem": maxvmem,
+            "arid": 0,
+            "ar_submission_time": 0,
+            "job_class": "NONE",
+            "qdel_info": "NONE",
+            "maxrss": maxvmem // 2,
+            "maxpss": maxvmem // 3,
+            "submit_host": "login1",
+            "cwd": "/home/%s" % job["owner"],
+            "submit_cmd": "qsub %s" % job["job_name"],
+        })
+        yield values
+
+
+def _format(value, kind):
+    if kind == "ms":
+        return "%d" % round(value * 1000)
+    if isinstance(value, float):
+        return "%.3f" % value
+    return str(value)
+
+
+def format_row(values, dialect):
+    """
+    Formats one row of values as a line of an accounting file.
+
+    :param values: Dict of field name to value, as generated by :py:func:`jobs`.
+    :param dialect: One of DIALECTS.
+    :rtype: str
+    """
+    if dialect == "uge":
+        fields = [_format(values.get(name, 0), kind) for name, kind in UGE_FIELDS]
+    else:
+        fields = []
+        for i, name in enumerate(SGE_DIALECTS[dialect]):
+            if name is not None:
+                value = values.get(name, 0)
+                if name in ("submission_time", "start_time", "end_time", "ru_wallclock"):
+                    value = int(value)
+                fields.append(_format(value, None))
+            elif i == 0:
+                fields.append("%d" % values["end_time"])
+            elif i == 1:
+                fields.append("acct")
+            else:
+                fields.append("0")
+    return ":".join(fields) + "\n"
+
+
+def write_accounting(fp, dialect, rows, seed=0):
+    """
+    Writes a synthetic accounting file.
+
+    Example::
+
+        >>> from gridengine_accounting.synthetic import write_accounting
+        >>> with open("accounting", "w") as fp:
+        ...     write_accounting(fp, "uge", 1000000)
+        1000000
+
+    :param fp: File object to write to.
+    :param dialect: One of DIALECTS.
+    :param rows: Number of rows.
+    :param seed: Seed of the random number generator.
+    :return: Number of rows written.
+    :rtype: int
+    """
+    if dialect not in DIALECTS:
+        raise ValueError("Unknown dialect: %s" % dialect)
+    if dialect == "uge":
+        fp.write(UGE_HEADER)
+    lines = []
+    for values in jobs(rows, seed):
+        lines.append(format_row(values, dialect))
+        if len(lines) == 10000:
+            fp.write("".join(lines))
+            lines = []
+    fp.write("".join(lines))
+    return rows
@@ -0,0 +1,167 @@
+# Copyright 2013 David Irvine
+#
+# This file is part of gridengine-accounting
+#
+# gridengine-accounting is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at
+# your option) any later version.
+#
+# gridengine-accounting is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gridengine-accounting.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Slot occupancy over time, per host, queue, project or any other grouping, for capacity planning.
+"""
+import operator
+
+MINUTE = 60
+HOUR = 3600
+
+
+class Timeline(object):
+    """
+    Computes the average number of busy slots in each time interval from the start_time, end_time and slots of
+    accounting entries.
+
+    Each job is recorded in constant time whatever its length: the intervals it covers completely are a +slots and
+    -slots pair in a difference array, and the two partly covered intervals at its ends get the slot seconds it
+    used in them.  The series is built with a running sum when it is read.  Entries that never started, which have
+    a start_time of 0, are skipped.
+
+    Example::
+
+        >>> from gridengine_accounting import UGEAccountFile
+        >>> from gridengine_accounting.timeline import Timeline, HOUR
+        >>> timeline = Timeline(interval=HOUR, group_by=["hostname"])
+        >>> timeline.update(UGEAccountFile(open("ug82_accounting"), lazy=True))
+        >>> for row in timeline.rows():
+        ...     print row["interval_start"], row["hostname"], row["busy_slots"]
+        [...]
+
+    :param interval: Length of each interval in seconds.
+    :param group_by: Attribute names to group by, empty for the whole cluster.
+    :param start: Time before which usage is ignored, or None.
+    :param end: Time after which usage is ignored, or None.
+    """
+    def __init__(self, interval=MINUTE, group_by=("hostname",), start=None, end=None):
+        self.interval = interval
+        self.group_by = list(group_by)
+        self.start = start
+        self.end = end
+        # Group key to (difference array, partial interval slot seconds), both dicts keyed by interval number.
+        self.groups = {}
+        self._key_getter = operator.attrgetter(*self.group_by) if self.group_by else lambda entry: ()
+        self._single_field = len(self.group_by) == 1
+
+    def _key(self, entry):
+        key = self._key_getter(entry)
+        if self._single_field:
+            key = (key,)
+        return key
+
+    def add(self, entry):
+        """Adds the usage of one entry."""
+        start = entry.start_time
+        if start:
+            self.add_usage(self._key(entry), start, entry.end_time, entry.slots)
+
+    def update(self, entries):
+        """Adds the usage of every entry from an iterable, such as an AccountFile or UGEAccountFile."""
+        key = self._key
+        add_usage = self.add_usage
+        for entry in entries:
+            start = entry.start_time
+            if start:
+                add_usage(key(entry), start, entry.end_time, entry.slots)
+
+    def add_usage(self, key, start, end, slots):
+        """
+        Adds slots busy from start to end to a group.
+
+        :param key: Group key tuple, with one value per group_by attribute.
+        :param start: Start time in seconds.
+        :param end: End time in seconds.
+        :param slots: Number of slots.
+        """
+        if self.start is not None and start < self.start:
+            start = self.start
+        if self.end is not None and end > self.end:
+            end = self.end
+        if end <= start:
+            return
+        try:
+            diff, partial = self.groups[key]
+        except KeyError:
+            diff, partial = self.groups[key] = ({}, {})
+        interval = self.interval
+        first = int(start // interval)
+        last = int(end // interval)
+        if first == last:
+            partial[first] = partial.get(first, 0) + slots * (end - start)
+            return
+        partial[first] = partial.get(first, 0) + slots * ((first + 1) * interval - start)
+        if end > last * interval:
+            partial[last] = partial.get(last, 0) + slots * (end - last * interval)
+        if last > first + 1:
+            diff[first + 1] = diff.get(first + 1, 0) + slots
+            diff[last] = diff.get(last, 0) - slots
+
+    def merge(self, other):
+        """Adds the usage recorded by another Timeline with the same interval and grouping."""
+        for key, (other_diff, other_partial) in other.groups.items():
+            try:
+                diff, partial = self.groups[key]
+            except KeyError:
+                diff, partial = self.groups[key] = ({}, {})
+            for i, value in other_diff.items():
+                diff[i] = diff.get(i, 0) + value
+            for i, value in other_partial.items():
+                partial[i] = partial.get(i, 0) + value
+
+    def series(self, key):
+        """
+        Returns the occupancy of one group, for every interval from its first to its last busy interval.
+
+        :param key: Group key tuple.
+        :return: Tuple of the start time of the first interval, and a list of the average busy slots in each
+            interval.
+        :rtype: tuple
+        """
+        diff, partial = self.groups[key]
+        numbers = set(diff) | set(partial)
+        first = min(numbers)
+        interval = float(self.interval)
+        values = []
+        busy = 0
+        for i in range(first, max(numbers) + 1):
+            busy += diff.get(i, 0)
+            values.append(busy + partial.get(i, 0) / interval)
+        return first * self.interval, values
+
+    def results(self):
+        """
+        Returns the series of every group.
+
+        :return: Dict of group key tuple to the (start, values) tuple returned by :py:meth:`series`.
+        :rtype: dict
+        """
+        return dict((key, self.series(key)) for key in self.groups)
+
+    def rows(self):
+        """
+        Generates flat dicts with interval_start, the group values and busy_slots, sorted by group key then time.
+        Idle intervals between busy ones are included with busy_slots of 0.
+        """
+        names = self.group_by
+        for key in sorted(self.groups):
+            start, values = self.series(key)
+            for i, busy in enumerate(values):
+                row = dict(zip(names, key))
+                row["interval_start"] = start + i * self.interval
+                row["busy_slots"] = busy
+                yield row
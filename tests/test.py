@@ -1,5 +1,27 @@
+import bz2
+import collections
+import csv
+import functools
+import gzip
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
-from gridengine_accounting import UGEAccountFile, UGEAccountEntry
+from gridengine_accounting import AccountFile, AccountEntry, Checkpoint, UGEAccountFile, UGEAccountEntry
+from gridengine_accounting import MalformedRowError, ParseStats, open_accounting
+from gridengine_accounting import aggregate, aio, cache, columnar, export, jobs, multi, scan, sketches, store, synthetic
+from gridengine_accounting import timeline
+from gridengine_accounting.index import AccountIndex
+
+# In memory file of the native str type, as written by the text exporters.
+NativeIO = io.BytesIO if str is bytes else io.StringIO
+
+
+def _count(entries):
+    return sum(1 for entry in entries)
 
 
 class TestUGE82(unittest.TestCase):
@@ -8,5 +30,604 @@ class TestUGE82(unittest.TestCase):
         for ac in UGEAccountFile(f):
             self.assertIsInstance(ac, UGEAccountEntry)
             self.assertIsInstance(ac.to_dict(), dict)
+
+    def test_block_size(self):
+        expected = [ac.to_dict() for ac in UGEAccountFile(open("ug82_accounting"))]
+        reader = UGEAccountFile(open("ug82_accounting"), block_size=7)
+        self.assertEqual([ac.to_dict() for ac in reader], expected)
+        self.assertEqual(reader._row_num, 25)
+        data = open("ug82_accounting", "rb").read().rstrip(b"\n")
+        self.assertEqual([ac.to_dict() for ac in UGEAccountFile(io.BytesIO(data), block_size=100)], expected)
+
+    def test_lazy(self):
+        entries = UGEAccountFile(open("ug82_accounting"))
+        lazy_entries = UGEAccountFile(open("ug82_accounting"), lazy=True)
+        for ac, lazy in zip(entries, lazy_entries):
+            self.assertIsInstance(lazy, UGEAccountEntry)
+            self.assertEqual(lazy.end_time, ac.end_time)
+            self.assertEqual(lazy.to_dict(), ac.to_dict())
+
+    def test_slots(self):
+        ac = next(UGEAccountFile(open("ug82_accounting")))
+        self.assertFalse(hasattr(ac, "__dict__"))
+        self.assertEqual(ac.submission_time_milliseconds, 1416358463256)
+        job = [e for e in UGEAccountFile(open("ug82_accounting")) if e.job_number == 2][0]
+        self.assertEqual((job.ru_wallclock, job.ru_wallclock_milliseconds), (0.009801, 9.801))
+        self.assertEqual(pickle.loads(pickle.dumps(ac)).to_dict(), ac.to_dict())
+        lazy = next(UGEAccountFile(open("ug82_accounting"), lazy=True))
+        self.assertEqual(pickle.loads(pickle.dumps(lazy)).to_dict(), ac.to_dict())
+
+    def test_index(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "accounting")
+            shutil.copy("ug82_accounting", path)
+            f = open(path)
+            self.assertEqual([ac.job_number for ac in UGEAccountFile(f).lookup(9)], [9])
+            self.assertTrue(os.path.exists(path + ".idx"))
+            found = UGEAccountFile(f).range(1416359122, 1416359436)
+            self.assertEqual([ac.job_number for ac in found], [2, 3])
+            self.assertEqual(list(UGEAccountFile(f).lookup(12345)), [])
+
+            lines = open("ug82_accounting").readlines()
+            with open(path, "a") as f:
+                f.write(lines[-1].replace(":16:sge:", ":50:sge:", 1).replace(":1416359", ":1416000", 3))
+                f.write(lines[-1][:30])
+            f = open(path)
+            self.assertEqual([ac.job_number for ac in UGEAccountFile(f).lookup(50)], [50])
+            self.assertEqual([ac.job_number for ac in UGEAccountFile(f).range(1, 1416359000)], [50])
+            self.assertEqual([ac.job_number for ac in UGEAccountFile(f).lookup(9)], [9])
+            self.assertEqual(AccountIndex(path + ".idx").source_size, os.path.getsize(path) - 30)
+            gz_path = os.path.join(tmp, "accounting.gz")
+            with gzip.open(gz_path, "wb") as out:
+                out.write(open("ug82_accounting", "rb").read())
+            self.assertRaises(ValueError, list, UGEAccountFile(gz_path).lookup(9))
+            self.assertRaises(ValueError, list, UGEAccountFile(gzip.open(gz_path)).lookup(9))
+
+            lines = open("ug82_accounting").readlines()
+            with open(path, "w") as f:
+                f.writelines(lines[:5] + [lines[5].replace(":2:sge:", ":x:sge:", 1)] + lines[6:])
+            os.remove(path + ".idx")
+            f = open(path)
+            self.assertEqual([ac.job_number for ac in UGEAccountFile(f, errors="skip").lookup(9)], [9])
+            found = UGEAccountFile(f, errors="skip").range(1416359122, 1416359436)
+            self.assertEqual([ac.job_number for ac in found], [3])
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_follow(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "accounting")
+            checkpoint_path = os.path.join(tmp, "checkpoint")
+            lines = open("ug82_accounting").readlines()
+            with open(path, "w") as f:
+                f.writelines(lines[:7])
+                f.write(lines[7][:20])
+            found = UGEAccountFile.follow(path, checkpoint_path=checkpoint_path, poll_interval=None)
+            self.assertEqual(next(found).job_number, 1)
+            found.close()
+            found = UGEAccountFile.follow(path, checkpoint_path=checkpoint_path, poll_interval=None)
+            self.assertEqual([ac.job_number for ac in found], [2, 3])
+            with open(path, "a") as f:
+                f.write(lines[7][20:])
+                f.writelines(lines[8:9])
+            found = UGEAccountFile.follow(path, checkpoint_path=checkpoint_path, poll_interval=None)
+            self.assertEqual([ac.job_number for ac in found], [4, 9])
+
+            os.rename(path, path + ".0")
+            with open(path, "w") as f:
+                f.writelines(lines[9:10])
+            found = UGEAccountFile.follow(path, checkpoint_path=checkpoint_path, poll_interval=None)
+            self.assertEqual(len(list(found)), 1)
+            self.assertEqual(Checkpoint.load(checkpoint_path).inode, os.stat(path).st_ino)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_compressed(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            expected = [ac.job_number for ac in UGEAccountFile("ug82_accounting")]
+            data = open("ug82_accounting", "rb").read()
+            for path, f in [(os.path.join(tmp, "accounting.gz"), gzip.GzipFile),
+                            (os.path.join(tmp, "accounting.bz2"), bz2.BZ2File)]:
+                out = f(path, "wb")
+                out.write(data)
+                out.close()
+                self.assertEqual([ac.job_number for ac in UGEAccountFile(path)], expected)
+                found = UGEAccountFile(open_accounting(path, buffer_size=100, threaded=True))
+                self.assertEqual([ac.job_number for ac in found], expected)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_aggregate(self):
+        aggregator = aggregate.Aggregator(group_by=["owner"], interval=aggregate.DAY)
+        aggregator.update(UGEAccountFile(open("ug82_accounting"), lazy=True))
+        rows = aggregator.rows()
+        self.assertEqual(sum(row["rows"] for row in rows), 21)
+        self.assertEqual(rows[0]["owner"], "irvined")
+        self.assertEqual(rows[0]["interval_start"] % aggregate.DAY, 0)
+        total = sum(ac.cpu for ac in UGEAccountFile(open("ug82_accounting")))
+        self.assertAlmostEqual(sum(row["cpu"] for row in rows), total)
+
+    def test_csv(self):
+        out = NativeIO()
+        self.assertEqual(export.write_csv(UGEAccountFile(open("ug82_accounting")), out, batch_size=4), 21)
+        rows = list(csv.reader(NativeIO(out.getvalue())))
+        self.assertEqual(len(rows), 22)
+        self.assertEqual(rows[0][:2], ["qname", "hostname"])
+        self.assertEqual(rows[1][:6], ["all.q", "master", "irvined", "irvined", "check.sh", "1"])
+
+    def test_jsonl(self):
+        out = NativeIO()
+        entries = list(UGEAccountFile(open("ug82_accounting")))
+        self.assertEqual(export.dump_jsonl(entries, out, batch_size=4), 21)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 21)
+        for line, ac in zip(lines, entries):
+            d = ac.to_dict()
+            for name, value in json.loads(line).items():
+                self.assertEqual(value, d[name])
+
+        out = NativeIO()
+        entries = list(AccountFile(io.BytesIO(SGE_ROWS)))
+        export.dump_jsonl(entries, out)
+        self.assertEqual(json.loads(out.getvalue().splitlines()[1]), entries[1].to_dict())
+
+    @unittest.skipIf(export.pyarrow is None, "pyarrow not installed")
+    def test_parquet(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "accounting.parquet")
+            self.assertEqual(export.write_parquet(UGEAccountFile(open("ug82_accounting")), path, batch_size=5), 21)
+            table = export.pyarrow.parquet.read_table(path)
+            self.assertEqual(table.column("job_number").to_pylist()[:3], [1, 2, 3])
+            path = os.path.join(tmp, "accounting.arrow")
+            self.assertEqual(export.write_arrow(columnar.UGEColumnReader(open("ug82_accounting"), rows=5), path), 21)
+            table = export.pyarrow.RecordBatchFileReader(export.pyarrow.OSFile(path)).read_all()
+            self.assertEqual(table.column("owner").to_pylist()[0], "irvined")
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_where(self):
+        found = [ac.job_number for ac in UGEAccountFile(open("ug82_accounting"), where={"job_number": [2, 3]})]
+        self.assertEqual(found, [2, 3])
+        found = list(UGEAccountFile(open("ug82_accounting"), where={"end_time_between": (1416359122, 1416359123)}))
+        self.assertEqual([ac.job_number for ac in found], [2])
+        found = list(UGEAccountFile(open("ug82_accounting"), where=lambda fields: fields[5] == "9"))
+        self.assertEqual([ac.job_number for ac in found], [9])
+
+    def test_parallel(self):
+        expected = [ac.job_number for ac in UGEAccountFile(open("ug82_accounting"))]
+        found = [ac.job_number for ac in UGEAccountFile.parallel("ug82_accounting", processes=2, chunk_size=1024)]
+        self.assertEqual(found, expected)
+
+    def test_parallel_errors(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            lines = open("ug82_accounting", "rb").readlines()
+            path = os.path.join(tmp, "accounting")
+            with open(path, "wb") as f:
+                f.write(b"".join(lines[:20] + [b"garbage:row\n"] + lines[20:]))
+            offset = len(b"".join(lines[:20]))
+            try:
+                list(UGEAccountFile.parallel(path, processes=2, chunk_size=1024))
+                self.fail("MalformedRowError not raised")
+            except MalformedRowError as e:
+                self.assertEqual((e.line_number, e.offset), (21, offset))
+            self.assertEqual(len(list(UGEAccountFile.parallel(path, processes=2, errors="skip"))), 21)
+            stats = ParseStats()
+            errors = []
+            counts = UGEAccountFile.parallel(path, processes=2, chunk_size=1024, func=_count, stats=stats,
+                                             error_log=errors, in_flight=1, errors="collect")
+            self.assertEqual(sum(counts), 21)
+            self.assertEqual((stats.rows, stats.comments, stats.rejected, stats.entries), (26, 4, 1, 21))
+            self.assertEqual([(e.line_number, e.offset) for e in errors], [(21, offset)])
+        finally:
+            shutil.rmtree(tmp)
+        error = pickle.loads(pickle.dumps(MalformedRowError("bad", 3, 10, "row")))
+        self.assertEqual((error.reason, error.line_number, error.offset, error.row), ("bad", 3, 10, "row"))
+
+    def test_stats(self):
+        seen = []
+        reader = UGEAccountFile(open("ug82_accounting"), profile=True, block_size=1024, hook=seen.append)
+        self.assertEqual(len(list(reader)), 21)
+        stats = reader.stats
+        self.assertEqual((stats.rows, stats.comments, stats.entries), (25, 4, 21))
+        self.assertEqual(stats.dialects, {"uge": 21})
+        self.assertEqual(stats.bytes, os.path.getsize("ug82_accounting"))
+        self.assertTrue(stats.timings["convert"] > 0)
+        self.assertTrue(len(seen) > 2)
+        self.assertEqual(seen[-1].to_dict(), dict(stats.to_dict(), timings=seen[-1].timings))
+
+    def test_errors(self):
+        lines = open("ug82_accounting", "rb").readlines()
+        data = b"".join(lines[:6] + [b"garbage:row\n"] + lines[6:])
+        offset = len(b"".join(lines[:6]))
+        self.assertRaises(MalformedRowError, list, UGEAccountFile(io.BytesIO(data)))
+        reader = UGEAccountFile(io.BytesIO(data), errors="skip")
+        self.assertEqual(len(list(reader)), 21)
+        self.assertEqual((reader.stats.rejected, reader.errors), (1, []))
+        reader = UGEAccountFile(io.BytesIO(data), errors="collect", block_size=100)
+        self.assertEqual(len(list(reader)), 21)
+        self.assertEqual([(e.line_number, e.offset, e.row) for e in reader.errors], [(7, offset, "garbage:row")])
+        self.assertRaises(ValueError, UGEAccountFile, io.BytesIO(data), errors="ignore")
+
+    def test_mapped_scan(self):
+        entries = list(UGEAccountFile(open("ug82_accounting")))
+        with scan.MappedAccountFile("ug82_accounting") as f:
+            self.assertEqual(f.count(), 21)
+            self.assertEqual(f.count(where={"job_number": [2, 3]}), 2)
+            found = list(f.scan(["job_number", "owner", "end_time"], where={"end_time_between": (0, 1416359123)}))
+            expected = [(ac.job_number, ac.owner, ac.end_time) for ac in entries if ac.end_time <= 1416359123]
+            self.assertEqual(found, expected)
+            self.assertRaises(ValueError, list, f.scan(["no_such_field"]))
+
+    def test_job_merge(self):
+        merger = jobs.JobMerger(horizon=60, check_every=1)
+        summaries = []
+        for ac in UGEAccountFile(open("ug82_accounting")):
+            summaries.extend(merger.add(ac))
+            self.assertTrue(len(merger.jobs) <= 9)
+        summaries.extend(merger.flush())
+        self.assertEqual(sorted(job.job_number for job in summaries), list(range(1, 17)))
+        job = [job for job in summaries if job.job_number == 4][0]
+        self.assertEqual((job.rows, job.failed_rows, job.tasks, job.retries), (2, 1, 1, 1))
+        self.assertEqual((job.start_time, job.end_time), (1416359445.104, 1416359455.11))
+        self.assertEqual(job.maxvmem, 19947520)
+        entries = list(UGEAccountFile(open("ug82_accounting")))
+        for ac, maxrss in zip([ac for ac in entries if ac.job_number == 4], [4096, 2048]):
+            ac.maxrss = maxrss
+        merged = list(jobs.JobMerger(max_jobs=2).merge(entries))
+        self.assertEqual(sum(job.rows for job in merged), 21)
+        merged = list(jobs.JobMerger(horizon=60).merge(entries))
+        self.assertEqual([job.maxrss for job in merged if job.job_number == 4], [4096])
+
+    def test_sketches(self):
+        a = sketches.QuantileSketch(relative_accuracy=0.01)
+        b = sketches.QuantileSketch(relative_accuracy=0.01)
+        for value in range(1, 10001):
+            (a if value % 2 else b).add(value)
+        a.merge(b)
+        self.assertEqual(a.count, 10000)
+        for q, expected in ((0.0, 1), (0.5, 5000), (0.99, 9900), (1.0, 10000)):
+            self.assertTrue(abs(a.quantile(q) - expected) <= expected * 0.011)
+        histogram = sketches.Histogram([0, 10, 100])
+        for value in (-1, 0, 5, 10, 99, 100):
+            histogram.add(value)
+        self.assertEqual((histogram.underflow, histogram.counts, histogram.overflow), (1, [2, 2], 1))
+
+        metrics = sketches.MetricSketches(group_by=["owner"])
+        metrics.update(UGEAccountFile(open("ug82_accounting")))
+        wait = metrics.sketches[("irvined",)]["wait_time"]
+        self.assertEqual(wait.count, 16)
+        waits = sorted(sketches.wait_time(ac) for ac in UGEAccountFile(open("ug82_accounting")) if ac.start_time)
+        self.assertEqual(wait.max, waits[-1])
+        self.assertTrue(abs(wait.quantile(0.5) - waits[7]) <= waits[7] * 0.011)
+
+        histogram = functools.partial(sketches.Histogram, edges=[0, 60, 3600])
+        metrics = sketches.MetricSketches(group_by=[], factory={"wait_time": histogram})
+        metrics.update(UGEAccountFile(open("ug82_accounting")))
+        self.assertEqual(metrics.sketches[()]["wait_time"].edges, [0, 60, 3600])
+        self.assertEqual(metrics.sketches[()]["maxvmem"].count, 21)
+
+    def test_multi_file(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            data = open("ug82_accounting", "rb").read()
+            with open(os.path.join(tmp, "accounting"), "wb") as f:
+                f.write(data)
+            with gzip.open(os.path.join(tmp, "accounting.0.gz"), "wb") as f:
+                f.write(data)
+            path = os.path.join(tmp, "accounting")
+            list(UGEAccountFile(open(path)).lookup(9))
+            Checkpoint(100).save(path + ".checkpoint")
+            files = multi.MultiAccountFile(os.path.join(tmp, "accounting*"), processes=2)
+            self.assertEqual(files.paths, [path, path + ".0.gz"])
+            end_times = [ac.end_time for ac in files]
+            self.assertEqual(len(end_times), 42)
+            self.assertEqual(end_times, sorted(end_times))
+            found = [ac.end_time for ac in multi.MultiAccountFile(files.paths, processes=1, run_size=5)]
+            self.assertEqual(found, end_times)
+            totals = files.aggregate(group_by=["owner"]).results()
+            self.assertEqual(totals[("irvined",)]["rows"], 42)
+            with open(path, "ab") as f:
+                f.write(b"garbage:row\n")
+            self.assertRaises(MalformedRowError, list, multi.MultiAccountFile(files.paths))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_store_sync(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "accounting")
+            lines = open("ug82_accounting", "rb").readlines()
+            with open(path, "wb") as f:
+                f.writelines(lines)
+            db = store.AccountStore(os.path.join(tmp, "accounting.db"))
+            self.assertEqual(db.sync(path, chunk_size=1024), 21)
+            self.assertEqual(db.sync(path), 0)
+            with open(path, "ab") as f:
+                f.write(lines[-1])
+                f.write(lines[-2][:20])
+            self.assertEqual(db.sync(path), 0)  # The appended row was already stored.
+            db.close()
+            db = store.AccountStore(os.path.join(tmp, "accounting.db"))
+            self.assertEqual(db.query("SELECT COUNT(*) FROM accounting WHERE job_number = ?", [16]), [(1,)])
+            self.assertEqual(db.query('SELECT "group", end_time FROM accounting WHERE job_number = 2'),
+                             [("irvined", 1416359122.829)])
+            os.rename(path, path + ".0")
+            self.assertEqual(db.sync(path + ".0"), 0)
+            with open(path, "wb") as f:
+                f.write(lines[5].replace(b":2:sge:", b":102:sge:").replace(b"sleep.sh", b"sl\xc3\xa9ep.sh"))
+                f.write(lines[5].replace(b":2:sge:", b":103:sge:").replace(b"sleep.sh", b"sl\xe9ep.sh"))
+                f.write(b"garbage:row\n")
+            self.assertRaises(MalformedRowError, db.sync, path)
+            self.assertEqual(db.sync(path, errors="skip"), 2)
+            names = db.query("SELECT job_name FROM accounting WHERE job_number > 100 ORDER BY job_number")
+            self.assertEqual(names, [(u"sl\xe9ep.sh",), (u"sl\ufffdep.sh",)])
+            db.close()
+        finally:
+            shutil.rmtree(tmp)
+
+
+SGE_ROWS = (
+    b"all.q:node1:staff:alice:job.sh:100:sge:0:1416358463:1416359112:1416359142:0:0:30:1.5:0.5:1548:0:0:0:0:1284:0:0:"
+    b"0:8:0:0:0:6:0:NONE:defaultdepartment:NONE:1:0:2.0:0.1:0.01:NONE:0.0:NONE:1024.0:0:0\n"
+    b"all.q:node2:staff:bob:job.sh:101:sge:0:1416358463:1416359112:1416359182:0:0:70:1.5:0.5:1548:0:0:0:0:1284:0:0:"
+    b"0:8:0:0:0:6:0:NONE:defaultdepartment:NONE:2:0:2.0:0.1:0.01:NONE:0.0:NONE:1024.0:0:0\n"
+)
+
+
+class TestSGE(unittest.TestCase):
+    def test_accounting(self):
+        entries = list(AccountFile(io.BytesIO(SGE_ROWS)))
+        self.assertEqual([ac.job_number for ac in entries], [100, 101])
+        self.assertIsInstance(entries[0], AccountEntry)
+        self.assertFalse(hasattr(entries[0], "__dict__"))
+        self.assertEqual(entries[0].to_dict()["owner"], "alice")
+
+    def test_dialects(self):
+        row = SGE_ROWS.splitlines()[0]
+        fields = row.split(b":")
+        acct = b"1416359142:acct:" + row + b"\n"
+        univa = b":".join(fields[:12] + fields[13:40]) + b"\n"
+        sge, = AccountFile(io.BytesIO(row + b"\n"))
+        self.assertEqual(sge.maxvmem, 1024.0)
+        self.assertEqual(sge.project, "None")
+        self.assertEqual(sge.to_dict()["project"], None)
+        reader = AccountFile(io.BytesIO(acct + univa))
+        self.assertEqual(reader.dialect, None)
+        ac, ud = reader
+        self.assertEqual(reader.dialect, "acct")
+        self.assertEqual(ac.to_dict(), sge.to_dict())
+        self.assertEqual(ud.job_number, 100)
+        self.assertEqual(ud.cpu, 2.0)
+        self.assertEqual(ud.exit_status, 0)
+        self.assertEqual(ud.maxvmem, 0.0)
+
+    def test_stats(self):
+        row = SGE_ROWS.splitlines()[0]
+        univa = b":".join(row.split(b":")[:12] + row.split(b":")[13:40]) + b"\n"
+        data = b"# comment\n" + SGE_ROWS + univa
+        reader = AccountFile(io.BytesIO(data), where={"owner": "alice"})
+        self.assertEqual(len(list(reader)), 2)
+        stats = reader.stats
+        self.assertEqual((stats.rows, stats.comments, stats.rejected, stats.filtered, stats.entries), (4, 1, 0, 1, 2))
+        self.assertEqual(stats.dialects, {"sge": 2, "univa": 1})
+        self.assertEqual(stats.bytes, len(data))
+
+    def test_errors(self):
+        row = SGE_ROWS.splitlines()[0]
+        bad_value = row.replace(b":alice:", b":alice:x", 1).replace(b":100:", b":x100:", 1) + b"\n"
+        data = SGE_ROWS + b"1416359200:acct:short\n" + b"1416359200:new_job:1\n" + bad_value
+        reader = AccountFile(io.BytesIO(data))
+        self.assertEqual(len(list(reader)), 2)
+        self.assertEqual(reader.stats.rejected, 3)
+        errors = [(e.line_number, e.offset) for e in reader.errors]
+        self.assertEqual(errors, [(3, len(SGE_ROWS)), (5, len(SGE_ROWS) + 43)])
+        self.assertTrue("line 3" in str(reader.errors[0]))
+        reader = AccountFile(io.BytesIO(data), errors="collect", max_errors=1)
+        list(reader)
+        self.assertEqual(len(reader.errors), 1)
+        self.assertRaises(MalformedRowError, list, AccountFile(io.BytesIO(data), errors="raise"))
+
+    def test_aggregate(self):
+        aggregator = aggregate.Aggregator()
+        aggregator.update(AccountFile(io.BytesIO(SGE_ROWS)))
+        results = aggregator.results()
+        self.assertEqual(sorted(results), [("alice",), ("bob",)])
+        self.assertAlmostEqual(results[("alice",)]["io"], 0.01)
+        self.assertEqual(results[("bob",)]["slot_seconds"], 140)
+
+    def test_job_merge(self):
+        failed = SGE_ROWS.splitlines()[1].replace(b":sge:0:1416358463:1416359112:1416359182:0:",
+                                                  b":sge:0:1416358463:0:0:26:") + b"\n"
+        merged = list(jobs.JobMerger().merge(AccountFile(io.BytesIO(SGE_ROWS + failed))))
+        found = [(job.job_number, job.rows, job.failed_rows) for job in merged]
+        self.assertEqual(sorted(found), [(100, 1, 0), (101, 2, 1)])
+        self.assertEqual(merged[0].maxrss, None)
+
+    def test_mapped_scan(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "reporting")
+            rows = SGE_ROWS.splitlines()
+            with open(path, "wb") as f:
+                f.write(b"1416359142:acct:" + rows[0] + b"\n")
+                f.write(b"1416359100:new_job:1416359100:6:-1:NONE:job.sh:alice:staff:all.q:1024\n")
+                f.write(b"1416359100:job_log:1416359100:pending:6:0:NONE:1416359100:sge:alice:staff:all.q:"
+                        b"NONE:NONE:1024:new job\n")
+                f.write(b"1416359182:acct:" + rows[1][:100])
+            with scan.MappedAccountFile(path, dialect="acct") as mapped:
+                self.assertEqual(mapped.count(), 1)
+                self.assertEqual(list(mapped.scan(["job_number", "owner"])), [(100, "alice")])
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_where(self):
+        found = list(AccountFile(io.BytesIO(SGE_ROWS), where={"owner": "bob"}))
+        self.assertEqual([ac.job_number for ac in found], [101])
+        found = list(AccountFile(io.BytesIO(SGE_ROWS), where={"end_time_between": (0, 1416359150)}))
+        self.assertEqual([ac.job_number for ac in found], [100])
+
+    def test_synthetic(self):
+        expected = None
+        for dialect in synthetic.DIALECTS:
+            out = NativeIO()
+            synthetic.write_accounting(out, dialect, 500, seed=7)
+            data = out.getvalue()
+            again = NativeIO()
+            synthetic.write_accounting(again, dialect, 500, seed=7)
+            self.assertEqual(again.getvalue(), data)
+            reader = (UGEAccountFile if dialect == "uge" else AccountFile)(NativeIO(data))
+            found = [(ac.job_number, ac.task_number, ac.owner) for ac in reader]
+            self.assertEqual(len(found), 500)
+            if dialect != "uge":
+                self.assertEqual(reader.dialect, dialect)
+            self.assertEqual(found, expected or found)
+            expected = found
+
+    def test_timeline(self):
+        usage = timeline.Timeline(interval=60, group_by=[])
+        usage.update(AccountFile(io.BytesIO(SGE_ROWS)))
+        start, values = usage.series(())
+        self.assertEqual(start, 1416359100)
+        self.assertEqual(len(values), 2)
+        self.assertAlmostEqual(values[0], (30 + 48 * 2) / 60.0)
+        self.assertAlmostEqual(values[1], 22 * 2 / 60.0)
+
+        Job = collections.namedtuple("Job", "hostname start_time end_time slots")
+        usage = timeline.Timeline(interval=60, group_by=["hostname"])
+        usage.update([Job("node1", 30, 330, 2), Job("node1", 120, 180, 1), Job("node2", 60, 120, 4), Job("node2", 0, 0, 1)])
+        other = timeline.Timeline(interval=60, group_by=["hostname"])
+        other.add(Job("node2", 120, 150, 2))
+        usage.merge(other)
+        self.assertEqual(usage.series(("node1",)), (0, [1.0, 2.0, 3.0, 2.0, 2.0, 1.0]))
+        self.assertEqual(usage.series(("node2",)), (60, [4.0, 1.0]))
+        self.assertEqual(len(list(usage.rows())), 8)
+
+
+@unittest.skipIf(columnar.numpy is None, "numpy not installed")
+class TestColumnar(unittest.TestCase):
+    def test_columns(self):
+        entries = list(UGEAccountFile(open("ug82_accounting")))
+        columns = columnar.read_columns(open("ug82_accounting"))
+        self.assertEqual(list(columns["job_number"]), [e.job_number for e in entries])
+        self.assertEqual(list(columns["end_time"]), [e.end_time for e in entries])
+        self.assertEqual(list(columns["owner"]), [e.owner for e in entries])
+
+    def test_chunks(self):
+        batches = list(columnar.UGEColumnReader(open("ug82_accounting"), rows=7))
+        self.assertEqual(len(batches[0]["cpu"]), 7)
+        array = columnar.read_structured(open("ug82_accounting"), rows=3)
+        self.assertEqual(len(array), 3)
+        self.assertEqual(array["job_number"][0], 1)
+
+    def test_cache(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "accounting")
+            shutil.copy("ug82_accounting", path)
+            columns = cache.open_cache(path)
+            self.assertEqual(list(columns["job_number"]), list(columnar.read_columns(open(path))["job_number"]))
+            self.assertEqual(list(cache.open_cache(path)["owner"]), list(columns["owner"]))
+            with open(path, "a") as f:
+                f.write(open("ug82_accounting").readlines()[-1])
+            self.assertRaises(cache.StaleCacheError, cache.read_cache, path + ".cache", path)
+            self.assertEqual(len(cache.open_cache(path)["owner"]), 22)
+            self.assertEqual(multi.MultiAccountFile(os.path.join(tmp, "accounting*")).paths, [path])
+
+            gz_path = os.path.join(tmp, "accounting.0.gz")
+            with gzip.open(gz_path, "wb") as f:
+                f.write(open("ug82_accounting", "rb").read())
+            self.assertEqual(list(cache.open_cache(gz_path)["job_number"]), list(columns["job_number"]))
+            self.assertEqual(list(cache.read_cache(gz_path + ".cache", gz_path)["owner"]), list(columns["owner"]))
+
+            path = os.path.join(tmp, "sge_accounting")
+            with open(path, "wb") as f:
+                f.write(SGE_ROWS)
+            columns = cache.open_cache(path, reader_class=AccountFile)
+            self.assertEqual(list(columns["owner"]), ["alice", "bob"])
+            self.assertEqual(list(columns["pe_taskid"]), [-1, -1])
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_aggregate(self):
+        expected = aggregate.Aggregator(group_by=["owner", "hostname"], interval=3600)
+        expected.update(UGEAccountFile(open("ug82_accounting")))
+        aggregator = aggregate.Aggregator(group_by=["owner", "hostname"], interval=3600)
+        for columns in columnar.UGEColumnReader(open("ug82_accounting"), rows=4):
+            aggregator.add_columns(columns)
+        self.assertEqual(sorted(aggregator.groups), sorted(expected.groups))
+        for key, totals in expected.results().items():
+            for name, value in totals.items():
+                self.assertAlmostEqual(aggregator.results()[key][name], value)
+
+    def test_where(self):
+        reader = columnar.UGEColumnReader(open("ug82_accounting"), where={"job_number": [2, 3]})
+        self.assertEqual(list(next(reader)["job_number"]), [2, 3])
+        self.assertEqual(reader.stats.filtered, 19)
+
+    def test_errors(self):
+        lines = open("ug82_accounting", "rb").readlines()
+        data = b"".join(lines[:5] + [lines[5].replace(b":2:sge:", b":x:sge:", 1)] + lines[6:])
+        self.assertRaises(MalformedRowError, list, columnar.UGEColumnReader(io.BytesIO(data), rows=5))
+        batches = list(columnar.UGEColumnReader(io.BytesIO(data), rows=5, errors="skip"))
+        self.assertEqual(sum(len(batch["job_number"]) for batch in batches), 20)
+        self.assertTrue(2 not in batches[0]["job_number"])
+        reader = columnar.UGEColumnReader(io.BytesIO(lines[5].replace(b":2:sge:", b":x:sge:", 1)), errors="collect")
+        self.assertEqual(list(reader), [])
+        self.assertEqual([(e.line_number, e.offset) for e in reader.errors], [(1, None)])
+        data = b"".join(lines[:6] + [b"garbage:row\n"] + lines[6:])
+        reader = columnar.UGEColumnReader(io.BytesIO(data), errors="collect")
+        self.assertEqual(len(next(reader)["job_number"]), 21)
+        self.assertEqual(reader.errors[0].line_number, 7)
+
+    def test_parallel(self):
+        batches = list(columnar.UGEColumnReader.parallel("ug82_accounting", processes=2, chunk_size=1024, rows=5))
+        self.assertEqual(sum(len(batch["cpu"]) for batch in batches), 21)
+
+@unittest.skipIf(aio.asyncio is None, "asyncio not available")
+class TestAsync(unittest.TestCase):
+    def setUp(self):
+        self.loop = aio.asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_aggregate(self):
+        source = aio.AsyncAccountFile(UGEAccountFile(open("ug82_accounting")), batch_size=4, read_ahead=2,
+                                      loop=self.loop)
+        failed = aio.AsyncFilter(source, lambda ac: ac.failed)
+        aggregator = self.loop.run_until_complete(aio.aggregate(failed, aggregate.Aggregator()))
+        self.assertEqual(aggregator.results()[("irvined",)]["rows"], 6)
+
+    def test_iterate(self):
+        source = aio.AsyncAccountFile(UGEAccountFile(open("ug82_accounting")), batch_size=5, loop=self.loop)
+        found = []
+        while True:
+            try:
+                found.append(self.loop.run_until_complete(source.__anext__()).job_number)
+            except StopAsyncIteration:
+                break
+        self.assertEqual(found, [ac.job_number for ac in UGEAccountFile(open("ug82_accounting"))])
+
+    def test_path(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, "accounting.0.gz")
+            with gzip.open(path, "wb") as f:
+                f.write(open("ug82_accounting", "rb").read())
+            created = self.loop.create_future()
+            # Created while the loop runs, so the running loop is used.
+            self.loop.call_soon(lambda: created.set_result(aio.AsyncAccountFile(UGEAccountFile(path))))
+            source = self.loop.run_until_complete(created)
+            aggregator = self.loop.run_until_complete(aio.aggregate(source, aggregate.Aggregator()))
+            self.assertEqual(aggregator.results()[("irvined",)]["rows"], 21)
+        finally:
+            shutil.rmtree(tmp)
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()